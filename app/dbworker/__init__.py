@@ -1 +1,4 @@
 from .dbworker import PostgresConnection
+from .cache import QueryCache, CACHE_CHANNEL, COMPETITIONS_TAG, competition_tag, group_tag
+from .profiler import QueryProfiler
+from . import queries
@@ -0,0 +1,89 @@
+import time
+import typing as tp
+from collections import OrderedDict
+
+CACHE_CHANNEL = 'bet_bot_cache'
+COMPETITIONS_TAG = 'competitions'
+
+
+def competition_tag(competition_id: int) -> str:
+    return f'competition:{competition_id}'
+
+
+def group_tag(group_id: int) -> str:
+    return f'group:{group_id}'
+
+
+class QueryCache:
+    """
+    In-process cache for query results with a TTL per entry and LRU eviction.
+
+    Entries are keyed by query text and arguments and carry tags such as 'competition:<id>' or 'group:<id>';
+    invalidating a tag drops every entry carrying it. Writes that race with an invalidation are not stored.
+    """
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: tp.OrderedDict[tp.Hashable, tp.Tuple[float, tp.Any, tp.FrozenSet[str]]] = OrderedDict()
+        self._tags: tp.Dict[str, tp.Set[tp.Hashable]] = {}
+
+    @staticmethod
+    def make_key(query: str, args: tp.Tuple) -> tp.Hashable:
+        return query, args
+
+    def get(self, key: tp.Hashable) -> tp.Tuple[bool, tp.Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key: tp.Hashable, value: tp.Any, tags: tp.Iterable[str] = (), ttl: tp.Optional[float] = None,
+            generation: tp.Optional[int] = None) -> None:
+        """
+        Stores a value, unless something was invalidated since generation was read.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        if key in self._entries:
+            self._drop(key)
+        tags = frozenset(tags)
+        self._entries[key] = (time.monotonic() + (self.default_ttl if ttl is None else ttl), value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str) -> int:
+        self.generation += 1
+        dropped = 0
+        for tag in tags:
+            for key in self._tags.pop(tag, set()):
+                if key in self._entries:
+                    self._drop(key)
+                    dropped += 1
+        return dropped
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._tags.clear()
+
+    def stats(self) -> tp.Dict[str, int]:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _drop(self, key: tp.Hashable) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
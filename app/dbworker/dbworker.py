@@ -1,63 +1,426 @@
+import asyncio
+import contextlib
+import dataclasses
+import itertools
+import time
 import typing as tp
 import asyncpg
 import logging
 
+from app.dbworker import queries
+from app.dbworker.cache import CACHE_CHANNEL, QueryCache
+from app.dbworker.profiler import QueryProfiler
+from app.dbworker.singleflight import SingleFlight
+
+
+def _as_record(row: tp.Any) -> tp.Tuple:
+    if dataclasses.is_dataclass(row):
+        return dataclasses.astuple(row)
+    return tuple(row)
+
+
+def _chunks(data: tp.Iterable[tp.Any], size: int) -> tp.Iterator[tp.List[tp.Tuple]]:
+    iterator = iter(data)
+    while True:
+        chunk = [_as_record(row) for row in itertools.islice(iterator, size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _insert(conn: asyncpg.Connection, table_name: str, columns: tp.List[str], data: tp.Iterable[tp.Any],
+                  chunk_size: int, copy_threshold: int) -> None:
+    schema_name, _, table = table_name.rpartition('.')
+    placeholders = ', '.join(f'${i}' for i in range(1, len(columns) + 1))
+    insert_stmt = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    for chunk in _chunks(data, chunk_size):
+        if len(chunk) < copy_threshold:
+            await conn.executemany(insert_stmt, chunk)
+        else:
+            await conn.copy_records_to_table(table, records=chunk, columns=columns, schema_name=schema_name or None)
+
+
+class Replica:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.pool: tp.Optional[asyncpg.Pool] = None
+        self.lag: float = 0.0
+        self.healthy = False
+
 
 class PostgresConnection:
-    def __init__(self, dbname: str, user: str, password: str, host: str):
+    """
+    Connection pools to the primary (through pgbouncer on port 6432) and the read replicas.
+
+    statement_cache_size is asyncpg's per-connection cache of named prepared statements. It defaults to 0, because
+    pgbouncer in transaction pooling mode hands every transaction a different server connection, where a named
+    statement prepared earlier doesn't exist. Raise it only with session pooling or a direct connection.
+
+    For the same reason, cache invalidations are received over listen_dsn, a direct connection to the primary:
+    LISTEN through pgbouncer in transaction pooling mode never gets the notifications.
+    """
+    def __init__(self, dbname: str, user: str, password: str, host: str, min_size: int = 2, max_size: int = 10,
+                 max_inactive_connection_lifetime: float = 300.0, statement_cache_size: int = 0,
+                 copy_threshold: int = 100, copy_chunk_size: int = 10000,
+                 replica_dsns: tp.Optional[tp.List[str]] = None, max_replica_lag: float = 5.0,
+                 replica_check_interval: float = 5.0, cache: tp.Optional[QueryCache] = None,
+                 profiler: tp.Optional[QueryProfiler] = None, listen_dsn: tp.Optional[str] = None):
         self.user = user
         self.password = password
         self.host = host
         self.dbname = dbname
         self.conn_string = f'postgresql://{self.user}:{self.password}@{self.host}:6432/{self.dbname}'
+        self.listen_dsn = listen_dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_inactive_connection_lifetime = max_inactive_connection_lifetime
+        self.statement_cache_size = statement_cache_size
+        self.copy_threshold = copy_threshold
+        self.copy_chunk_size = copy_chunk_size
+        self.replicas = [Replica(dsn) for dsn in replica_dsns or []]
+        self.max_replica_lag = max_replica_lag
+        self.replica_check_interval = replica_check_interval
+        self.cache = cache
+        self.single_flight = SingleFlight()
+        self.profiler = profiler
+        self._invalidation_hooks: tp.List[tp.Tuple[tp.Callable[..., None], bool]] = []
+        self._invalidated_at = float('-inf')
+        self._background_tasks: tp.Set[asyncio.Task] = set()
+        self.pool: tp.Optional[asyncpg.Pool] = None
+        self._listener: tp.Optional[asyncpg.Connection] = None
+        self._replica_counter = itertools.count()
+        self._replica_monitor: tp.Optional[asyncio.Task] = None
+
+    async def _make_pool(self, dsn: str) -> asyncpg.Pool:
+        pool = await asyncpg.create_pool(dsn, min_size=self.min_size, max_size=self.max_size,
+                                         max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+                                         statement_cache_size=self.statement_cache_size)
+        await pool.execute('select 1')
+        return pool
+
+    async def create_pool(self) -> None:
+        """
+        Creates the connection pools (primary and read replicas) and warms them up, so the first handlers don't pay
+        for connection setup. A replica that can't be reached is skipped until the monitor sees it come back.
+        """
+        if self.pool is not None:
+            return
+        self.pool = await self._make_pool(self.conn_string)
+        logging.info(f'Connection pool created with {self.pool.get_size()} connections')
+
+        for replica in self.replicas:
+            await self._check_replica(replica)
+        if self.replicas:
+            self._replica_monitor = asyncio.create_task(self._monitor_replicas())
+
+        if self.cache is not None or self._invalidation_hooks:
+            await self._listen_for_invalidations()
+
+    async def close_pool(self) -> None:
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        if self.cache is not None:
+            logging.info(f'Query cache stats: {self.cache.stats()}')
+        logging.info(f'Single-flight stats: {self.single_flight.stats()}')
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._replica_monitor is not None:
+            self._replica_monitor.cancel()
+            self._replica_monitor = None
+        for replica in self.replicas:
+            if replica.pool is not None:
+                await replica.pool.close()
+                replica.pool = None
+                replica.healthy = False
+        if self.pool is None:
+            return
+        await self.pool.close()
+        self.pool = None
+        logging.info('Connection pool closed')
 
-    async def get_data(self, query: str) -> tp.List:
-        conn = await asyncpg.connect(self.conn_string)
+    async def _check_replica(self, replica: Replica) -> None:
         try:
-            rows = await conn.fetch(query)
-            return [dict(row) for row in rows]
+            if replica.pool is None:
+                replica.pool = await self._make_pool(replica.dsn)
+            replica.lag = float(await replica.pool.fetchval(queries.REPLICA_LAG))
+            replica.healthy = True
+        except (OSError, asyncio.TimeoutError, asyncpg.exceptions.PostgresError,
+                asyncpg.exceptions.InterfaceError) as e:
+            if replica.healthy:
+                logging.error(f'Read replica {replica.dsn.rpartition("@")[2]} is down: {e}')
+            replica.healthy = False
+
+    async def _monitor_replicas(self) -> None:
+        while True:
+            await asyncio.sleep(self.replica_check_interval)
+            for replica in self.replicas:
+                await self._check_replica(replica)
+
+    async def _listen_for_invalidations(self) -> None:
+        """
+        Subscribes to cache invalidations sent by other processes, e.g. the parser, with NOTIFY on CACHE_CHANNEL.
+        Without the subscription cached entries still expire by TTL.
+        """
+        if self.listen_dsn is None:
+            logging.warning('No direct listen DSN, listening for cache invalidations through pgbouncer: in transaction '
+                            'pooling mode they are never delivered and cached entries only expire by TTL')
+        try:
+            self._listener = await asyncpg.connect(self.listen_dsn or self.conn_string)
+            await self._listener.add_listener(CACHE_CHANNEL, self._on_invalidation)
+        except (OSError, asyncpg.exceptions.PostgresError, asyncpg.exceptions.InterfaceError) as e:
+            logging.warning(f'Could not subscribe to cache invalidations, relying on TTL: {e}')
+            if self._listener is not None:
+                await self._listener.close()
+                self._listener = None
+
+    def _on_invalidation(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        self.invalidate(*payload.split(','), notified=True)
+
+    def add_invalidation_hook(self, hook: tp.Callable[..., None], notified_only: bool = False) -> None:
+        """
+        Registers a callback called with the invalidated tags, both for local writes and for NOTIFYs from other
+        processes, so in-process caches outside the query cache can follow the same tags.
+
+        :param hook: The callback.
+        :param notified_only: Call it only for NOTIFYs from other processes, e.g. the parser, not for local writes.
+        """
+        self._invalidation_hooks.append((hook, notified_only))
+
+    def invalidate(self, *tags: str, notified: bool = False) -> None:
+        """
+        Drops cached results carrying any of the tags.
+
+        :param tags: Cache tags.
+        :param notified: The tags came with a NOTIFY from another process.
+        """
+        if not tags:
+            return
+        self._invalidated_at = time.monotonic()
+        if self.cache is not None:
+            self.cache.invalidate(*tags)
+        for hook, notified_only in self._invalidation_hooks:
+            if notified or not notified_only:
+                hook(*tags)
+
+    @contextlib.contextmanager
+    def profiled(self, query: str, args: tp.Tuple, explain_pool: tp.Optional[asyncpg.Pool] = None) -> tp.Iterator[None]:
+        """
+        Times the statement run inside the block and hands it to the profiler. When the profiler samples a slow read
+        and explain_pool is given, its plan is captured in the background with EXPLAIN (ANALYZE, BUFFERS).
+        """
+        start = time.perf_counter()
+        try:
+            yield
         finally:
-            await conn.close()
+            if self.profiler is not None and self.profiler.record(query, args, time.perf_counter() - start) \
+                    and explain_pool is not None:
+                task = asyncio.create_task(self._explain(explain_pool, query, args))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
 
-    async def insert_data(self, table_name: str, columns: tp.List[str], data: tp.List[tp.Tuple]):
+    async def _explain(self, pool: asyncpg.Pool, query: str, args: tp.Tuple) -> None:
+        try:
+            plan = await pool.fetch(f'EXPLAIN (ANALYZE, BUFFERS) {query}', *args)
+        except (OSError, asyncpg.exceptions.PostgresError, asyncpg.exceptions.InterfaceError) as e:
+            logging.error(f'Could not capture query plan: {e}')
+            return
+        self.profiler.record_plan(query, args, [row[0] for row in plan])
+
+    def _acquire(self):
+        if self.pool is None:
+            raise RuntimeError('Connection pool is not created, call create_pool() first')
+        return self.pool.acquire()
+
+    def _pick_replica(self) -> tp.Optional[Replica]:
+        available = [replica for replica in self.replicas
+                     if replica.healthy and replica.pool is not None and replica.lag <= self.max_replica_lag]
+        if not available:
+            return None
+        return available[next(self._replica_counter) % len(available)]
+
+    async def get_records(self, query: str, *args, primary: bool = False,
+                          cache_tags: tp.Optional[tp.Iterable[str]] = None,
+                          cache_ttl: tp.Optional[float] = None) -> tp.List[asyncpg.Record]:
+        """
+        Runs a query from the catalog and returns asyncpg records as they are. Records are tuple-like and can be
+        read by index or column name, so there is no per-row copy.
+
+        Reads are balanced round-robin over the healthy read replicas that don't lag behind more than
+        max_replica_lag seconds, falling back to the primary when there are none or the replica fails.
+
+        :param query: The query text, with $1, $2, ... placeholders for the arguments.
+        :param args: Query arguments.
+        :param primary: Read from the primary, for reads that must see the bot's own recent writes. Such reads never
+            return a cached result.
+        :param cache_tags: Opt into the query cache, tagging the result for invalidation.
+        :param cache_ttl: Cache TTL in seconds, defaults to the cache's default_ttl.
+        """
+        if self.cache is None or cache_tags is None:
+            return await self._fetch_once(query, args, primary)
+
+        key = self.cache.make_key(query, args)
+        # The key doesn't include primary: a cached result may have come from a replica, so primary reads skip it
+        # and only refresh the entry
+        if not primary:
+            found, rows = self.cache.get(key)
+            if found:
+                return rows
+        generation = self.cache.generation
+        # Right after an invalidation a replica may not have the write behind it yet, and the rows it returns would
+        # stay cached for the whole TTL, so results that fill the cache are read from the primary until then
+        primary = primary or time.monotonic() - self._invalidated_at < self.max_replica_lag
+        rows = await self._fetch_once(query, args, primary)
+        self.cache.set(key, rows, cache_tags, cache_ttl, generation=generation)
+        return rows
+
+    async def _fetch_once(self, query: str, args: tp.Tuple, primary: bool) -> tp.List[asyncpg.Record]:
+        """
+        Identical concurrent reads share one execution, so a burst of users asking for the same table costs a
+        single query.
+        """
+        return await self.single_flight.do((query, args, primary), lambda: self._fetch(query, args, primary))
+
+    async def _fetch(self, query: str, args: tp.Tuple, primary: bool) -> tp.List[asyncpg.Record]:
+        replica = None if primary else self._pick_replica()
+        if replica is not None:
+            try:
+                async with replica.pool.acquire() as conn:
+                    with self.profiled(query, args, explain_pool=replica.pool):
+                        return await conn.fetch(query, *args)
+            except (OSError, asyncpg.exceptions.PostgresConnectionError, asyncpg.exceptions.InterfaceError) as e:
+                logging.error(f'Read replica {replica.dsn.rpartition("@")[2]} failed, reading from primary: {e}')
+                replica.healthy = False
+
+        async with self._acquire() as conn:
+            with self.profiled(query, args, explain_pool=self.pool):
+                return await conn.fetch(query, *args)
+
+    async def get_data(self, query: str, *args, primary: bool = False,
+                       cache_tags: tp.Optional[tp.Iterable[str]] = None,
+                       cache_ttl: tp.Optional[float] = None) -> tp.List[tp.Dict]:
+        """
+        Runs a query from the catalog and returns its rows as dicts, see get_records.
+        """
+        rows = await self.get_records(query, *args, primary=primary, cache_tags=cache_tags, cache_ttl=cache_ttl)
+        return [dict(row) for row in rows]
+
+    async def iterate_chunks(self, query: str, *args, chunk_size: int = 1000,
+                             primary: bool = False) -> tp.AsyncIterator[tp.List[asyncpg.Record]]:
+        """
+        Streams a query's result as records in chunks of at most chunk_size rows from a server-side cursor, so memory
+        stays bounded however large the result is. Replica routing works like in get_records, without the mid-stream
+        fallback. Used for reads that grow with the number of users, like loading the membership index; the detailed
+        leaderboard doesn't need it, since POINTS_DETAILED_PAGE pivots and pages it in the database.
+
+        :param query: The query text, with $1, $2, ... placeholders for the arguments.
+        :param args: Query arguments.
+        :param chunk_size: How many rows to fetch per round-trip.
+        :param primary: Read from the primary.
         """
-        Inserts data into the specified table.
+        replica = None if primary else self._pick_replica()
+        acquire = replica.pool.acquire() if replica is not None else self._acquire()
+        async with acquire as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(query, *args)
+                while True:
+                    with self.profiled(query, args):
+                        rows = await cursor.fetch(chunk_size)
+                    if not rows:
+                        return
+                    yield rows
+
+    async def iterate_data(self, query: str, *args, chunk_size: int = 1000,
+                           primary: bool = False) -> tp.AsyncIterator[asyncpg.Record]:
+        """
+        Streams a query's result row by row, see iterate_chunks.
+        """
+        async for chunk in self.iterate_chunks(query, *args, chunk_size=chunk_size, primary=primary):
+            for row in chunk:
+                yield row
+
+    async def execute(self, query: str, *args, invalidate: tp.Iterable[str] = ()) -> str:
+        """
+        Runs a data-modifying statement from the catalog. A single statement is atomic on its own, so it is sent
+        without an explicit transaction and the extra BEGIN/COMMIT round-trips.
+
+        :param query: The statement text, with $1, $2, ... placeholders for the arguments.
+        :param args: Statement arguments.
+        :param invalidate: Cache tags to invalidate once the statement succeeded.
+        """
+        async with self._acquire() as conn:
+            try:
+                with self.profiled(query, args):
+                    status = await conn.execute(query, *args)
+            except Exception as e:
+                logging.error(f"Error executing statement: {e}")
+                raise
+        self.invalidate(*invalidate)
+        return status
+
+    async def execute_fetch(self, query: str, *args, invalidate: tp.Iterable[str] = ()) -> tp.List[asyncpg.Record]:
+        """
+        Runs a data-modifying statement that returns rows (RETURNING or a status select) on the primary. Unlike reads
+        it is never cached, coalesced or explained.
+
+        :param query: The statement text, with $1, $2, ... placeholders for the arguments.
+        :param args: Statement arguments.
+        :param invalidate: Cache tags to invalidate once the statement succeeded.
+        """
+        async with self._acquire() as conn:
+            try:
+                with self.profiled(query, args):
+                    rows = await conn.fetch(query, *args)
+            except Exception as e:
+                logging.error(f"Error executing statement: {e}")
+                raise
+        self.invalidate(*invalidate)
+        return rows
+
+    async def insert_data(self, table_name: str, columns: tp.List[str], data: tp.Iterable[tp.Any],
+                          chunk_size: tp.Optional[int] = None, invalidate: tp.Iterable[str] = ()):
+        """
+        Inserts data into the specified table in one transaction.
+
+        Small batches go through a prepared INSERT with executemany, large ones are streamed with COPY in chunks.
 
         :param table_name: The name of the table to insert data into.
         :param columns: A list of column names.
-        :param data: A list of tuples, where each tuple represents a row of data.
+        :param data: Rows to insert: tuples or dataclass instances with fields in the order of columns.
+        :param chunk_size: How many rows to send per COPY, defaults to copy_chunk_size.
+        :param invalidate: Cache tags to invalidate once the rows are committed.
         """
-        conn = await asyncpg.connect(self.conn_string)
-        try:
-            async with conn.transaction():
-                insert_stmt = f"""
-                    INSERT INTO {table_name} ({', '.join(columns)}) VALUES 
-                    {', '.join([str(row) if len(row) > 1 else str(row).replace(',', '') for row in data])}
-                """
-                await conn.execute(insert_stmt)
-        except Exception as e:
-            logging.error(f"Error inserting data: {e}")
-            raise
-        finally:
-            await conn.close()
+        async with self._acquire() as conn:
+            try:
+                with self.profiled(f'insert into {table_name}', ()):
+                    async with conn.transaction():
+                        await _insert(conn, table_name, columns, data, chunk_size or self.copy_chunk_size,
+                                      self.copy_threshold)
+            except Exception as e:
+                logging.error(f"Error inserting data into {table_name}: {e}")
+                raise
+        self.invalidate(*invalidate)
 
-    async def delete_data(self, table_name: str, condition: str):
+    async def delete_data(self, table_name: str, condition: str, *args, invalidate: tp.Iterable[str] = ()):
         """
         Deletes rows from the specified table based on a condition.
 
         :param table_name: The name of the table from which to delete data.
-        :param condition: The condition to filter rows to be deleted (e.g., "id = 1").
+        :param condition: The condition to filter rows to be deleted (e.g., "id = $1").
+        :param args: Arguments for the placeholders in the condition.
+        :param invalidate: Cache tags to invalidate once the rows are deleted.
         """
-        conn = await asyncpg.connect(self.conn_string)
-        try:
-            async with conn.transaction():
-                delete_stmt = f"""
-                    DELETE FROM {table_name}
-                    WHERE {condition}
-                """
-                await conn.execute(delete_stmt)
-        except Exception as e:
-            logging.error(f"Error deleting data: {e}")
-            raise
-        finally:
-            await conn.close()
+        async with self._acquire() as conn:
+            try:
+                async with conn.transaction():
+                    delete_stmt = f"""
+                        DELETE FROM {table_name}
+                        WHERE {condition}
+                    """
+                    with self.profiled(delete_stmt, args):
+                        await conn.execute(delete_stmt, *args)
+            except Exception as e:
+                logging.error(f"Error deleting data: {e}")
+                raise
+        self.invalidate(*invalidate)
@@ -0,0 +1,56 @@
+import logging
+import logging.handlers
+import random
+import sys
+import typing as tp
+
+
+class QueryProfiler:
+    """
+    Reports queries slower than threshold seconds, together with the code that issued them, to a rotating log file
+    for offline review. A sample_rate fraction of slow reads is additionally marked for EXPLAIN (ANALYZE, BUFFERS).
+    """
+    def __init__(self, threshold: float = 0.5, explain_sample_rate: float = 0.0,
+                 log_path: str = 'slow_queries.log', max_bytes: int = 10 * 2 ** 20, backup_count: int = 5):
+        self.threshold = threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.slow_queries = 0
+
+        self.logger = logging.getLogger('slow_queries')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+    @staticmethod
+    def _caller() -> str:
+        # The first handler frame up the await chain, otherwise the first frame outside the DB layer
+        caller = None
+        frame = sys._getframe(1)
+        while frame is not None:
+            module = frame.f_globals.get('__name__', '')
+            if module.startswith('app.handlers'):
+                return f'{module}.{frame.f_code.co_name}:{frame.f_lineno}'
+            if caller is None and not module.startswith(('app.dbworker', 'contextlib', 'asyncio')):
+                caller = f'{module}.{frame.f_code.co_name}:{frame.f_lineno}'
+            frame = frame.f_back
+        return caller or 'unknown'
+
+    def record(self, query: str, args: tp.Tuple, elapsed: float) -> bool:
+        """
+        Records one execution, returns whether its plan should be captured.
+        """
+        if elapsed < self.threshold:
+            return False
+        self.slow_queries += 1
+        caller = self._caller()
+        query_text = ' '.join(query.split())
+        logging.warning(f'Slow query ({elapsed * 1000:.0f} ms) from {caller}')
+        self.logger.info(f'{elapsed * 1000:.1f} ms from {caller}: {query_text} args={args!r}')
+        return random.random() < self.explain_sample_rate
+
+    def record_plan(self, query: str, args: tp.Tuple, plan: tp.List[str]) -> None:
+        query_text = ' '.join(query.split())
+        self.logger.info(f'Plan for {query_text} args={args!r}:\n' + '\n'.join(plan))
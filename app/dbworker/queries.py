@@ -0,0 +1,420 @@
+"""
+Catalog of the SQL statements used by the bot.
+
+Every statement is parameterized, so the query text stays the same for all users and groups and asyncpg can reuse
+the prepared statement cached on each pooled connection.
+"""
+
+MATCHES_TO_BET = """
+    select 
+            first_team || ' - ' || second_team as pair
+            ,id
+            ,$1::bigint as user_id
+            ,dt::timestamp - interval '3 hours' as dt_in_utc_0
+            ,'' as existing_bet
+    from 
+            bets.matches 
+    where
+            not exists (select 1 from bets.bets where bets.matches.id = bets.bets.match_id
+                and bets.bets.user_id = $1)
+            and exists (select 1 from bets.groups_in_competitions as gic where gic.competition_id = 
+            bets.matches.competition_id and case when gic.starting_stage = 'play off' then bets.matches.stage 
+            like '%final%' else 1 = 1 end)
+            and competition_id = $2
+            and dt - now() > interval '1 hours'
+    order by dt
+"""
+
+BETS_TO_CHANGE = """
+    with pre_final as 
+    (
+    select 
+            mtchs.first_team || ' - ' || mtchs.second_team as pair
+            ,betting.match_id as id
+            ,$1::bigint as user_id
+            ,mtchs.dt::timestamp - interval '3 hours' as dt_in_utc_0
+            ,betting.first_team_goals || ':' || betting.second_team_goals || 
+                case 
+                    when betting.penalty_winner = 0 then '' 
+                    else ', ' || betting.penalty_winner || ' team wins penalty'
+                end
+            as existing_bet
+            ,row_number() over (partition by betting.match_id order by betting.insert_date desc) as rn
+    from 
+            bets.bets as betting
+    join 
+            bets.matches as mtchs
+                on betting.match_id = mtchs.id
+    where
+            betting.user_id = $1
+            and mtchs.dt - now() > interval '1 hours'
+            and betting.competition_id = $2
+            and betting.group_id = $3
+    )
+    select 
+            pair
+            ,id
+            ,user_id
+            ,dt_in_utc_0
+            ,existing_bet
+    from
+            pre_final
+    where 
+            rn = 1
+    order by dt_in_utc_0
+"""
+
+STARTED_STAGE_MATCHES = """
+    select 
+            first_team || ' - ' || second_team as pair
+            ,id
+    from 
+            bets.matches 
+    where
+            competition_id = $1
+            and stage = $2
+            and dt < now()
+    order by dt
+"""
+
+MATCH_BETS = """
+    with cte as (
+        select 
+                mtchs.first_team
+                ,mtchs.second_team
+                ,betting.first_team_goals
+                ,betting.second_team_goals
+                ,betting.penalty_winner
+                ,case when usr.id = $1 then 'Me' else usr.first_name || ' ' || usr.last_name 
+                 end as name
+                ,row_number() over (partition by betting.user_id order by betting.insert_date desc) as rn
+        from 
+                bets.bets as betting
+        join 
+                bets.matches as mtchs
+                    on betting.match_id = mtchs.id
+        join 
+                bets.users as usr 
+                    on usr.id = betting.user_id
+        where 
+                betting.competition_id = $2
+                and betting.group_id = $3
+                and mtchs.stage = $4
+                and mtchs.id = $5
+    )
+    select
+            first_team
+            ,first_team_goals
+            ,second_team_goals
+            ,second_team
+            ,penalty_winner
+            ,name
+    from 
+            cte
+    where 
+            rn = 1
+    order by 6
+"""
+
+STAGE_MATCHES = """
+    select 
+            first_team
+            ,first_team_goals
+            ,second_team_goals
+            ,second_team
+            ,penalty_winner 
+            ,dt::timestamp - interval '3 hours' as dt_in_utc_0
+    from 
+            bets.matches
+    where 
+            competition_id = $1
+            and stage = $2
+    order by 6
+"""
+
+POINTS = """
+    select
+            user_name 
+            ,points
+            ,money_
+    from 
+            bets.points
+    where 
+            competition_id = $1
+            and group_id = $2
+    order by 
+            points desc
+"""
+
+POINTS_DETAILED_PAGE = """
+    with cells as (
+        select 
+                user_name
+                ,stage || ': ' || pair as pair
+                ,sum(points) as points
+        from 
+                bets.points_detailed
+        where 
+                competition_id = $1
+                and group_id = $2
+        group by 
+                user_name, stage, pair
+    ), users as (
+        select 
+                user_name
+                ,sum(points) as total
+                ,row_number() over (order by sum(points) desc, user_name) as rn
+        from 
+                cells
+        group by 
+                user_name
+    ), pairs as (
+        select 
+                pair
+                ,row_number() over (order by pair collate "C") as rn
+        from 
+                (select distinct pair from cells) as p
+    ), page as (
+        select 
+                pair, rn
+        from 
+                pairs
+        where 
+                rn > $3
+        order by 
+                rn
+        limit $4
+    ), page_points as (
+        select 
+                pg.rn
+                ,array_agg(c.points order by u.rn) as points
+        from 
+                page as pg
+                cross join users as u
+                left join cells as c on c.pair = pg.pair and c.user_name = u.user_name
+        group by 
+                pg.rn
+    )
+    select 
+            (select count(*) from pairs) as pairs_count
+            ,(select array_agg(user_name order by rn) from users) as user_names
+            ,(select array_agg(total order by rn) from users) as totals
+            ,(select array_agg(pair order by rn) from page) as pairs
+            ,(select array_agg(points order by rn) from page_points) as points
+"""
+
+COMPETITION_STAGES = """
+    select
+            stage
+    from
+            bets.matches
+    where
+            competition_id = $1
+            and exists (select 1 from bets.groups_in_competitions as gic where gic.competition_id = 
+                bets.matches.competition_id and case when gic.starting_stage = 'play off' then bets.matches.stage 
+                like '%final%' else 1 = 1 end)
+    group by 
+            stage
+    order by 
+            min(dt)
+"""
+
+UPCOMING_COMPETITIONS = """
+    select
+            id, name, start_date
+    from
+            bets.competitions
+    where
+            start_date > now()
+    order by 
+            start_date
+"""
+
+GROUPS_ADDED_BY_USER = """
+    select
+            count(*) as cnt
+    from 
+            bets.groups_in_competitions
+    where
+            added_by = $1
+"""
+
+ADMIN_GROUPS_WITHOUT_BETS = """
+    select
+            grps.id,
+            grps.name
+    from 
+            bets.groups as grps
+    join
+            bets.users_in_groups as uig
+                on uig.group_id = grps.id
+    where
+            uig.user_id = $1
+            and uig.is_admin = true
+            and not exists (select 1 from bets.bets as bts where bts.group_id = grps.id) 
+"""
+
+ADMIN_GROUPS = """
+    select
+            grps.id,
+            grps.name
+    from 
+            bets.groups as grps
+    join
+            bets.users_in_groups as uig
+                on uig.group_id = grps.id
+    where
+            uig.user_id = $1
+            and uig.is_admin = True
+"""
+
+REMOVABLE_GROUP_MEMBERS = """
+    select
+            usr.id,
+            usr.first_name || ' ' || usr.last_name as user_name
+    from 
+            bets.groups as grps
+    join
+            bets.users_in_groups as uig
+                on uig.group_id = grps.id
+    join 
+            bets.users as usr
+                on usr.id = uig.user_id
+    where
+            uig.user_id != $1
+            and uig.group_id = $2
+            and not exists (select 1 from bets.bets as bts where bts.user_id = usr.id and bts.group_id = grps.id)
+"""
+
+UPSERT_USER = """
+    insert into bets.users (id, first_name, last_name, nickname)
+    values ($1, $2, $3, $4)
+    on conflict (id) do nothing
+"""
+
+JOIN_GROUP = """
+    with grp as (
+        select 
+                id
+        from 
+                bets.groups
+        where 
+                id = $2
+                and not exists (select 1 from bets.groups_in_competitions as gic join
+                 bets.competitions as cmp on cmp.id = gic.competition_id where  now() > cmp.start_date and gic.group_id 
+                 = bets.groups.id )
+    ), inserted as (
+        insert into bets.users_in_groups (user_id, group_id, added_by, is_admin)
+        select $1::bigint, id, $3::bigint, false from grp
+        on conflict (user_id, group_id) do nothing
+        returning 1
+    )
+    select 
+            case
+                when not exists (select 1 from grp) then 'not_joinable'
+                when exists (select 1 from inserted) then 'joined'
+                else 'already_member'
+            end as status
+"""
+
+DELETE_GROUP = """
+    with uig as (
+        delete from bets.users_in_groups
+        where group_id = $1
+        returning group_id
+    ), gic as (
+        delete from bets.groups_in_competitions
+        where group_id = $1
+        returning competition_id
+    ), grp as (
+        -- The scalar subqueries run before the group row is touched, so the group is always deleted after its
+        -- users_in_groups and groups_in_competitions rows
+        delete from bets.groups
+        where id = $1
+                and (select count(*) from uig) >= 0
+                and (select count(*) from gic) >= 0
+    )
+    select competition_id from gic
+"""
+
+DELETE_GROUP_MEMBER = """
+    delete from bets.users_in_groups
+    where group_id = $1 and user_id = $2
+"""
+
+CREATE_GROUP = """
+    with grp as (
+        insert into bets.groups (name)
+        values ($1)
+        returning id
+    ), gic as (
+        insert into bets.groups_in_competitions
+            (group_id, competition_id, added_by, money, invite_link, starting_stage)
+        select id, $2::bigint, $3::bigint, $4, $5, $6 from grp
+    )
+    insert into bets.users_in_groups (user_id, group_id, added_by, is_admin)
+    select $3::bigint, id, $3::bigint, true from grp
+"""
+
+REPLICA_LAG = """
+    select
+            case
+                when not pg_is_in_recovery() or pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+                else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+            end as lag
+"""
+
+MEMBERSHIPS = """
+    select 
+            uig.user_id
+            ,grp.id as group_id
+            ,grp.name as group_name
+            ,comp.id as competition_id
+            ,comp.name as competition_name
+            ,comp.end_date::timestamptz as end_date
+    from 
+            bets.users_in_groups as uig
+    join 
+            bets.groups as grp
+                on grp.id = uig.group_id
+    join 
+            bets.groups_in_competitions as gic
+                    on uig.group_id = gic.group_id
+    join
+            bets.competitions as comp
+                    on comp.id = gic.competition_id
+                    and now() - comp.end_date < $1
+"""
+
+GROUP_COMPETITIONS = """
+    select 
+            grp.id as group_id
+            ,grp.name as group_name
+            ,comp.id as competition_id
+            ,comp.name as competition_name
+            ,comp.end_date::timestamptz as end_date
+    from 
+            bets.groups as grp
+    join 
+            bets.groups_in_competitions as gic
+                    on grp.id = gic.group_id
+    join
+            bets.competitions as comp
+                    on comp.id = gic.competition_id
+    where 
+            grp.id = $1
+"""
+
+COMPETITION_GROUPS = """
+    select 
+            gic.group_id
+            ,comp.name as competition_name
+    from 
+            bets.groups_in_competitions as gic
+    join
+            bets.competitions as comp
+                    on comp.id = gic.competition_id
+    where 
+            gic.competition_id = $1
+            and now() - comp.end_date < interval '168 hours'
+"""
@@ -0,0 +1,50 @@
+import asyncio
+import typing as tp
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, other callers with the same key wait
+    for it and get the same result (or exception) instead of running their own. If the caller running the call is
+    cancelled, the ones waiting for it run the call again rather than being cancelled with it.
+    """
+    def __init__(self):
+        self.executions = 0
+        self.saved = 0
+        self._calls: tp.Dict[tp.Hashable, asyncio.Future] = {}
+
+    async def do(self, key: tp.Hashable, fn: tp.Callable[[], tp.Awaitable[tp.Any]]) -> tp.Any:
+        future = self._calls.get(key)
+        while future is not None:
+            self.saved += 1
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                self.saved -= 1
+                future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved, so a failure nobody else waited for isn't reported as never retrieved
+        future.add_done_callback(lambda done: done.exception())
+        self._calls[key] = future
+        self.executions += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> tp.Dict[str, int]:
+        return {'executions': self.executions, 'saved': self.saved, 'in_flight': len(self._calls)}
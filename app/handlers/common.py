@@ -7,8 +7,8 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.deep_linking import decode_payload
 
 from app.dbworker import PostgresConnection
-from app.models import User, UserInGroup
-from app.utils import generate_id, logger
+from app.models import User, UserInGroup, JoinStatus, MembershipIndex
+from app.utils import generate_id, logger, output_modes
 
 
 class OrderStates(StatesGroup):
@@ -17,11 +17,11 @@ class OrderStates(StatesGroup):
 
 
 async def starting_message(message: types.Message, state: FSMContext, command: CommandObject,
-                           pg_con: PostgresConnection):
+                           pg_con: PostgresConnection, membership: MembershipIndex):
     await state.clear()
     user = User.from_id((message.chat.id, message.chat.first_name, message.chat.last_name,
                          message.chat.username))
-    await user.check_existing(pg_con)
+    await user.register(pg_con)
 
     logger.info(f'User {message.chat.first_name} {message.chat.last_name} logged in')
 
@@ -42,11 +42,11 @@ async def starting_message(message: types.Message, state: FSMContext, command: C
 
         uig = UserInGroup.from_message((message.chat.id, generate_id(group_name), added_by))
 
-        if await uig.check_existing_group(pg_con):
-            await uig.check_existing(pg_con)
-        else:
-            await message.answer('There is no such group, your link is deprecated!')
-            return
+        if not membership.is_member(uig.user_id, uig.group_id):
+            if await uig.join(pg_con) == JoinStatus.NOT_JOINABLE:
+                await message.answer('There is no such group, your link is deprecated!')
+                return
+            await membership.add_member(pg_con, uig.user_id, uig.group_id)
 
     await message.answer("Hi! It's betting bot. Please check /help to check the rules", parse_mode="HTML")
 
@@ -55,15 +55,23 @@ async def helping_message(message: types.Message):
     await message.answer('Check rules here https://telegra.ph/Match-Prediction-Competition-Rules-06-27')
 
 
+async def output_mode_message(message: types.Message):
+    if await output_modes.toggle(message.chat.id):
+        await message.answer('Results will be sent as text tables. Send /output again to get images')
+    else:
+        await message.answer('Results will be sent as images. Send /output again to get text tables')
+
+
 async def wrong_command_message(message: types.Message):
     logger.info(f'User {message.chat.first_name} {message.chat.last_name} wrote {message.text}')
     await message.answer("Wrong command")
 
 
-def register_handlers_common(router: Router, pg_con: PostgresConnection):
+def register_handlers_common(router: Router, pg_con: PostgresConnection, membership: MembershipIndex):
     async def starting_message_wrapper(message: types.Message, command: CommandObject, state: FSMContext):
-        await starting_message(message, state, command, pg_con)
+        await starting_message(message, state, command, pg_con, membership)
 
     router.message.register(starting_message_wrapper, Command(commands=["start"]))
     router.message.register(helping_message, Command(commands=["help"]))
+    router.message.register(output_mode_message, Command(commands=["output"]))
     router.message.register(wrong_command_message)
@@ -6,21 +6,14 @@ from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.utils.deep_linking import create_start_link
 
-from app.dbworker import PostgresConnection
+from app.dbworker import PostgresConnection, queries, competition_tag
+from app.models import MembershipIndex
 from app.utils import generate_competition_keyboard, generate_starting_stage_keyboard, generate_id, is_integer, logger
 from app.handlers.manage_groups.states import OrderCreateGroup, ManageGroupsMenu
 
 
 async def check_groups(pg_con: PostgresConnection, user_id: int) -> bool:
-    query = f"""
-    select
-            count(*) as cnt
-    from 
-            bets.groups_in_competitions
-    where
-            added_by = {user_id}
-    """
-    nums = await pg_con.get_data(query)
+    nums = await pg_con.get_data(queries.GROUPS_ADDED_BY_USER, user_id, primary=True)
 
     return int(nums[0]['cnt']) <= 2
 
@@ -61,7 +54,8 @@ async def choose_money(call: types.CallbackQuery, state: FSMContext):
     await state.set_state(OrderCreateGroup.waiting_for_money_entering)
 
 
-async def create_invite_link(message: types.Message, state: FSMContext, pg_con: PostgresConnection):
+async def create_invite_link(message: types.Message, state: FSMContext, pg_con: PostgresConnection,
+                             membership: MembershipIndex):
     money = message.text
     user_data = await state.get_data()
 
@@ -80,15 +74,8 @@ async def create_invite_link(message: types.Message, state: FSMContext, pg_con:
         link = await create_start_link(bot=message.bot, payload=group_name + '_' + str(user_id), encode=True)
 
         try:
-            await pg_con.insert_data('bets.groups',
-                                     ['name'],
-                                     [(group_name,)])
-            await pg_con.insert_data('bets.groups_in_competitions',
-                                     ['group_id', 'competition_id', 'added_by', 'money', 'invite_link', 'starting_stage'],
-                                     [(generate_id(group_name), competition_id, user_id, money, link, start_stage)])
-            await pg_con.insert_data('bets.users_in_groups',
-                                     ['user_id', 'group_id', 'added_by', 'is_admin'],
-                                     [(user_id, generate_id(group_name), user_id, True)])
+            await pg_con.execute(queries.CREATE_GROUP, group_name, int(competition_id), user_id, int(money), link,
+                                 start_stage, invalidate=[competition_tag(int(competition_id))])
         except asyncpg.exceptions.UniqueViolationError:
             await message.answer('We got a double, please retry')
             logger.error('We have got a UniqueViolationError when creating group')
@@ -100,6 +87,7 @@ async def create_invite_link(message: types.Message, state: FSMContext, pg_con:
             await state.clear()
             return
 
+        await membership.add_member(pg_con, user_id, generate_id(group_name))
         await message.answer(f"Invite link created:\n```{link}```\nSend it to users you want to add to this group",
                              parse_mode='MARKDOWN')
         await state.clear()
@@ -115,9 +103,9 @@ async def create_invite_link(message: types.Message, state: FSMContext, pg_con:
         await state.set_state(OrderCreateGroup.waiting_for_money_entering)
 
 
-def register_handlers_create_groups(router: Router, pg_con: PostgresConnection):
+def register_handlers_create_groups(router: Router, pg_con: PostgresConnection, membership: MembershipIndex):
     async def create_invite_link_wrapper(message: types.Message, state: FSMContext):
-        await create_invite_link(message, state, pg_con)
+        await create_invite_link(message, state, pg_con, membership)
 
     async def choose_competition_wrapper(call: types.CallbackQuery, state: FSMContext):
         await choose_competition(call, state, pg_con)
@@ -2,7 +2,8 @@ from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
 
-from app.dbworker import PostgresConnection
+from app.dbworker import PostgresConnection, queries, competition_tag, group_tag
+from app.models import MembershipIndex
 from app.utils import logger
 from app.handlers.manage_groups.states import OrderDeleteGroup, ManageGroupsMenu
 
@@ -11,21 +12,7 @@ async def start_deleting_group(call: types.CallbackQuery, state: FSMContext, pg_
     user_data = await state.get_data()
     await call.message.bot.delete_message(call.message.chat.id, user_data['previous_message_id'])
 
-    query = f"""
-    select
-            grps.id,
-            grps.name
-    from 
-            bets.groups as grps
-    join
-            bets.users_in_groups as uig
-                on uig.group_id = grps.id
-    where
-            uig.user_id = {call.message.chat.id}
-            and uig.is_admin = true
-            and not exists (select 1 from bets.bets as bts where bts.group_id = grps.id) 
-    """
-    grps = await pg_con.get_data(query)
+    grps = await pg_con.get_data(queries.ADMIN_GROUPS_WITHOUT_BETS, call.message.chat.id)
 
     if len(grps) == 0:
         await call.message.answer("You are not an administrator in any group!")
@@ -41,25 +28,27 @@ async def start_deleting_group(call: types.CallbackQuery, state: FSMContext, pg_
     await state.set_state(OrderDeleteGroup.waiting_for_group_picking)
 
 
-async def delete_groups(call: types.CallbackQuery, state: FSMContext, pg_con: PostgresConnection):
+async def delete_groups(call: types.CallbackQuery, state: FSMContext, pg_con: PostgresConnection,
+                        membership: MembershipIndex):
     group_id = call.data.split('_')[1]
 
     user_data = await state.get_data()
     await call.message.bot.delete_message(call.message.chat.id, user_data['previous_message_id'])
 
-    await pg_con.delete_data('bets.users_in_groups', f"group_id = {group_id}")
-    await pg_con.delete_data('bets.groups_in_competitions', f"group_id = {group_id}")
-    await pg_con.delete_data('bets.groups', f"id = {group_id}")
+    rows = await pg_con.execute_fetch(queries.DELETE_GROUP, int(group_id))
+    # COMPETITION_STAGES depends on the competition's groups, so its tag goes too, like when a group is created
+    pg_con.invalidate(group_tag(int(group_id)), *(competition_tag(row['competition_id']) for row in rows))
+    membership.remove_group(int(group_id))
     await call.message.answer(f"You deleted group {group_id} successfully")
     logger.info(f"User {user_data['asking_user_id']} deleted group {group_id}")
 
 
-def register_handlers_delete_groups(router: Router, pg_con: PostgresConnection):
+def register_handlers_delete_groups(router: Router, pg_con: PostgresConnection, membership: MembershipIndex):
     async def start_deleting_group_wrapper(call: types.CallbackQuery, state: FSMContext):
         await start_deleting_group(call, state, pg_con)
 
     async def delete_groups_wrapper(call: types.CallbackQuery, state: FSMContext):
-        await delete_groups(call, state, pg_con)
+        await delete_groups(call, state, pg_con, membership)
 
     router.callback_query.register(start_deleting_group_wrapper,
                                    StateFilter(ManageGroupsMenu.waiting_for_action_choice))
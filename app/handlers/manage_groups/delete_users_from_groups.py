@@ -2,7 +2,8 @@ from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
 
-from app.dbworker import PostgresConnection
+from app.dbworker import PostgresConnection, queries, group_tag
+from app.models import MembershipIndex
 from app.utils import logger
 from app.handlers.manage_groups.states import OrderDeleteUser, ManageGroupsMenu
 
@@ -11,20 +12,7 @@ async def start_deleting_user_from_group(call: types.CallbackQuery, state: FSMCo
     user_data = await state.get_data()
     await call.message.bot.delete_message(call.message.chat.id, user_data['previous_message_id'])
 
-    query = f"""
-    select
-            grps.id,
-            grps.name
-    from 
-            bets.groups as grps
-    join
-            bets.users_in_groups as uig
-                on uig.group_id = grps.id
-    where
-            uig.user_id = {call.message.chat.id}
-            and uig.is_admin = True
-    """
-    grps = await pg_con.get_data(query)
+    grps = await pg_con.get_data(queries.ADMIN_GROUPS, call.message.chat.id)
 
     if len(grps) == 0:
         await call.message.answer("You are not an administrator in any group!")
@@ -54,24 +42,8 @@ async def group_picked(call: types.CallbackQuery, state: FSMContext, pg_con: Pos
 
 async def pick_user_from_group(message: types.Message, state: FSMContext, pg_con: PostgresConnection):
     user_data = await state.get_data()
-    query = f"""
-    select
-            usr.id,
-            usr.first_name || ' ' || usr.last_name as user_name
-    from 
-            bets.groups as grps
-    join
-            bets.users_in_groups as uig
-                on uig.group_id = grps.id
-    join 
-            bets.users as usr
-                on usr.id = uig.user_id
-    where
-            uig.user_id != {user_data['asking_user_id']}
-            and uig.group_id = {user_data['group_id']}
-            and not exists (select 1 from bets.bets as bts where bts.user_id = usr.id and bts.group_id = grps.id)
-    """
-    users = await pg_con.get_data(query)
+    users = await pg_con.get_data(queries.REMOVABLE_GROUP_MEMBERS, int(user_data['asking_user_id']),
+                                  int(user_data['group_id']))
 
     if len(users) == 0:
         await message.answer("There are no members in this group or they placed bets!")
@@ -87,15 +59,19 @@ async def pick_user_from_group(message: types.Message, state: FSMContext, pg_con
     await state.set_state(OrderDeleteUser.waiting_for_user_picking)
 
 
-async def delete_user_from_group(call: types.CallbackQuery, state: FSMContext, pg_con: PostgresConnection):
+async def delete_user_from_group(call: types.CallbackQuery, state: FSMContext, pg_con: PostgresConnection,
+                                 membership: MembershipIndex):
     user_data = await state.get_data()
     user_id = call.data.split('_')[1]
-    await pg_con.delete_data('bets.users_in_groups', f"group_id = {user_data['group_id']} and user_id = {user_id}")
+    await pg_con.execute(queries.DELETE_GROUP_MEMBER, int(user_data['group_id']), int(user_id),
+                         invalidate=[group_tag(int(user_data['group_id']))])
+    membership.remove_member(int(user_id), int(user_data['group_id']))
     await call.message.answer(f"You deleted user {user_id} successfully")
     logger.info(f"User {user_data['asking_user_id']} deleted user {user_id} from group {user_data['group_id']}")
 
 
-def register_handlers_delete_users_from_groups(router: Router, pg_con: PostgresConnection):
+def register_handlers_delete_users_from_groups(router: Router, pg_con: PostgresConnection,
+                                               membership: MembershipIndex):
     async def start_deleting_user_from_group_wrapper(call: types.CallbackQuery, state: FSMContext):
         await start_deleting_user_from_group(call, state, pg_con)
 
@@ -103,7 +79,7 @@ def register_handlers_delete_users_from_groups(router: Router, pg_con: PostgresC
         await group_picked(call, state, pg_con)
 
     async def delete_user_from_group_wrapper(call: types.CallbackQuery, state: FSMContext):
-        await delete_user_from_group(call, state, pg_con)
+        await delete_user_from_group(call, state, pg_con, membership)
 
     router.callback_query.register(start_deleting_user_from_group_wrapper,
                                    StateFilter(ManageGroupsMenu.waiting_for_action_choice))
@@ -3,6 +3,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command, StateFilter
 
 from app.dbworker import PostgresConnection
+from app.models import MembershipIndex
 from app.utils import generate_manage_groups_keyboard
 from app.handlers.manage_groups.create_groups import register_handlers_create_groups, choose_competition
 from app.handlers.manage_groups.delete_groups import register_handlers_delete_groups, start_deleting_group
@@ -31,7 +32,7 @@ async def handle_manage_groups_choice(call: types.CallbackQuery, state: FSMConte
         await start_deleting_user_from_group(call, state, pg_con)
 
 
-def register_handlers_manage_groups(router: Router, pg_con: PostgresConnection):
+def register_handlers_manage_groups(router: Router, pg_con: PostgresConnection, membership: MembershipIndex):
     async def handle_manage_groups_choice_wrapper(call: types.CallbackQuery, state: FSMContext):
         await handle_manage_groups_choice(call, state, pg_con)
 
@@ -40,6 +41,6 @@ def register_handlers_manage_groups(router: Router, pg_con: PostgresConnection):
                                    F.data.startswith('manage_'),
                                    StateFilter(ManageGroupsMenu.waiting_for_action_choice))
 
-    register_handlers_create_groups(router, pg_con)
-    register_handlers_delete_groups(router, pg_con)
-    register_handlers_delete_users_from_groups(router, pg_con)
+    register_handlers_create_groups(router, pg_con, membership)
+    register_handlers_delete_groups(router, pg_con, membership)
+    register_handlers_delete_users_from_groups(router, pg_con, membership)
@@ -1,10 +1,13 @@
+from datetime import timedelta
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command, StateFilter
 
-from app.dbworker import PostgresConnection
+from app.dbworker import PostgresConnection, queries, group_tag
+from app.models import Bet, MembershipIndex
 from app.utils import logger, generate_teams_keyboard, generate_number_keyboard
 
 
@@ -16,30 +19,11 @@ class OrderPlaceBets(StatesGroup):
     waiting_for_penalty_winner = State()
 
 
-async def start_bet_process(message: Message, state: FSMContext, pg_con: PostgresConnection, new_bet=True):
+async def start_bet_process(message: Message, state: FSMContext, pg_con: PostgresConnection,
+                            membership: MembershipIndex, new_bet=True):
     await state.clear()
 
-    query_get = f"""
-    select 
-            comp.name || ' - ' || grp.name  as c_g_pair
-            ,comp.id as competition_id
-            ,grp.id as group_id
-    from 
-            bets.users_in_groups as uig
-    join 
-            bets.groups as grp
-                on grp.id = uig.group_id
-    join 
-            bets.groups_in_competitions as gic
-                    on uig.group_id = gic.group_id
-    join
-            bets.competitions as comp
-                    on comp.id = gic.competition_id
-                    and now() - comp.end_date < interval '24 hours'
-    where 
-            uig.user_id = {message.chat.id}
-    """
-    comps = await pg_con.get_data(query_get)
+    comps = membership.get(message.chat.id, timedelta(hours=24))
 
     if len(comps) == 0:
         await message.answer("You don't participate in any competition!")
@@ -48,24 +32,26 @@ async def start_bet_process(message: Message, state: FSMContext, pg_con: Postgre
     elif len(comps) > 1:
         keyboard_buttons = []
         for comp in comps:
-            keyboard_buttons.append([InlineKeyboardButton(text=comp['c_g_pair'],
-                                                          callback_data=f"competition_{comp['competition_id']}_"
-                                                                        f"{comp['group_id']}")])
+            keyboard_buttons.append([InlineKeyboardButton(text=comp.c_g_pair,
+                                                          callback_data=f"competition_{comp.competition_id}_"
+                                                                        f"{comp.group_id}")])
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
         msg = await message.answer("Please choose a competition and group pair:", reply_markup=keyboard)
         await state.update_data(previous_message_id=msg.message_id)
         await state.set_state(OrderPlaceBets.waiting_for_comp_and_group_picking)
     else:
-        await state.update_data(competition_id=comps[0]['competition_id'], group_id=comps[0]['group_id'])
+        await state.update_data(competition_id=comps[0].competition_id, group_id=comps[0].group_id)
         await start_picking_match(message, state, pg_con, new_bet=new_bet)
 
 
-async def start_placing_a_bet(message: Message, state: FSMContext, pg_con: PostgresConnection):
-    await start_bet_process(message, state, pg_con, new_bet=True)
+async def start_placing_a_bet(message: Message, state: FSMContext, pg_con: PostgresConnection,
+                              membership: MembershipIndex):
+    await start_bet_process(message, state, pg_con, membership, new_bet=True)
 
 
-async def start_changing_a_bet(message: Message, state: FSMContext, pg_con: PostgresConnection):
-    await start_bet_process(message, state, pg_con, new_bet=False)
+async def start_changing_a_bet(message: Message, state: FSMContext, pg_con: PostgresConnection,
+                               membership: MembershipIndex):
+    await start_bet_process(message, state, pg_con, membership, new_bet=False)
 
 
 async def competition_picked(call: CallbackQuery, state: FSMContext, pg_con: PostgresConnection):
@@ -79,66 +65,10 @@ async def competition_picked(call: CallbackQuery, state: FSMContext, pg_con: Pos
 async def start_picking_match(message: Message, state: FSMContext, pg_con: PostgresConnection, new_bet=True):
     user_data = await state.get_data()
     if new_bet:
-        query_get = f"""
-        select 
-                first_team || ' - ' || second_team as pair
-                ,id
-                ,{message.chat.id} as user_id
-                ,dt::timestamp - interval '3 hours' as dt_in_utc_0
-                ,'' as existing_bet
-        from 
-                bets.matches 
-        where
-                not exists (select 1 from bets.bets where bets.matches.id = bets.bets.match_id
-                    and bets.bets.user_id = {message.chat.id})
-                and exists (select 1 from bets.groups_in_competitions as gic where gic.competition_id = 
-                bets.matches.competition_id and case when gic.starting_stage = 'play off' then bets.matches.stage 
-                like '%final%' else 1 = 1 end)
-                and competition_id = {user_data['competition_id']}
-                and dt - now() > interval '1 hours'
-        order by dt
-        """
+        teams = await pg_con.get_data(queries.MATCHES_TO_BET, message.chat.id, int(user_data['competition_id']))
     else:
-        query_get = f"""
-        with pre_final as 
-        (
-        select 
-                mtchs.first_team || ' - ' || mtchs.second_team as pair
-                ,betting.match_id as id
-                ,{message.chat.id} as user_id
-                ,mtchs.dt::timestamp - interval '3 hours' as dt_in_utc_0
-                ,betting.first_team_goals || ':' || betting.second_team_goals || 
-                    case 
-                        when betting.penalty_winner = 0 then '' 
-                        else ', ' || betting.penalty_winner || ' team wins penalty'
-                    end
-                as existing_bet
-                ,row_number() over (partition by betting.match_id order by betting.insert_date desc) as rn
-        from 
-                bets.bets as betting
-        join 
-                bets.matches as mtchs
-                    on betting.match_id = mtchs.id
-        where
-                betting.user_id = {message.chat.id}
-                and mtchs.dt - now() > interval '1 hours'
-                and betting.competition_id = {user_data['competition_id']}
-                and betting.group_id = {user_data['group_id']}
-        )
-        select 
-                pair
-                ,id
-                ,user_id
-                ,dt_in_utc_0
-                ,existing_bet
-        from
-                pre_final
-        where 
-                rn = 1
-        order by dt_in_utc_0
-        """
-
-    teams = await pg_con.get_data(query_get)
+        teams = await pg_con.get_data(queries.BETS_TO_CHANGE, message.chat.id, int(user_data['competition_id']),
+                                      int(user_data['group_id']))
 
     if len(teams) == 0:
         await message.answer("You've placed all the bets!")
@@ -209,21 +139,20 @@ async def penalty_winner_entered(call: CallbackQuery, state: FSMContext, pg_con:
 
 async def save_bet(call: CallbackQuery, state: FSMContext, pg_con: PostgresConnection):
     user_data = await state.get_data()
-    await pg_con.insert_data('bets.bets',
-                             ['match_id', 'user_id', 'first_team_goals', 'second_team_goals',
-                              'penalty_winner', 'group_id', 'competition_id'],
-                             [(user_data['match_id'], user_data['user_id'], user_data['first_team_goals'],
-                               user_data['second_team_goals'], user_data['penalty_winner'],
-                               user_data['group_id'], user_data['competition_id'])])
+    bet = Bet(match_id=int(user_data['match_id']), user_id=int(user_data['user_id']),
+              first_team_goals=user_data['first_team_goals'], second_team_goals=user_data['second_team_goals'],
+              penalty_winner=user_data['penalty_winner'], group_id=int(user_data['group_id']),
+              competition_id=int(user_data['competition_id']))
+    await pg_con.insert_data('bets.bets', Bet.columns(), [bet], invalidate=[group_tag(bet.group_id)])
 
     await call.message.answer("Your bet has been placed successfully!", reply_markup=ReplyKeyboardRemove())
     logger.info(f'Bet for match {user_data["match_id"]} for user {user_data["user_id"]} is written successfully')
     await state.clear()
 
 
-def register_handlers_add_bet(router: Router, pg_con: PostgresConnection):
+def register_handlers_add_bet(router: Router, pg_con: PostgresConnection, membership: MembershipIndex):
     async def start_placing_a_bet_wrapper(message: Message, state: FSMContext):
-        await start_placing_a_bet(message, state, pg_con)
+        await start_placing_a_bet(message, state, pg_con, membership)
 
     async def penalty_winner_entered_wrapper(call: CallbackQuery, state: FSMContext):
         await penalty_winner_entered(call, state, pg_con)
@@ -235,7 +164,7 @@ def register_handlers_add_bet(router: Router, pg_con: PostgresConnection):
         await competition_picked(call, state, pg_con)
 
     async def start_changing_a_bet_wrapper(message: Message, state: FSMContext):
-        await start_changing_a_bet(message, state, pg_con)
+        await start_changing_a_bet(message, state, pg_con, membership)
 
     router.message.register(start_placing_a_bet_wrapper, Command("add_bet"), StateFilter("*"))
     router.message.register(start_changing_a_bet_wrapper, Command("change_bet"), StateFilter("*"))
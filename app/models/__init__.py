@@ -1 +1,2 @@
-from .model import User, UserInGroup
+from .model import User, UserInGroup, JoinStatus, Group, Match, Bet
+from .membership import Membership, MembershipIndex
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import dataclasses
+import datetime
+import typing as tp
+
+from app.dbworker import PostgresConnection, queries
+from app.models.model import Row
+from app.utils.utilities import logger
+
+# Memberships of competitions that ended longer ago than this are never shown
+MAX_WINDOW = datetime.timedelta(hours=168)
+
+
+@dataclasses.dataclass
+class Membership(Row):
+    __slots__ = ('group_id', 'group_name', 'competition_id', 'competition_name', 'end_date')
+    group_id: int
+    group_name: str
+    competition_id: int
+    competition_name: str
+    end_date: datetime.datetime
+
+    @property
+    def c_g_pair(self) -> str:
+        return f'{self.competition_name} - {self.group_name}'
+
+
+class MembershipIndex:
+    """
+    In-memory index of user -> (competition, group) memberships, used by the entry commands instead of the
+    users_in_groups/groups/groups_in_competitions/competitions join.
+
+    It is loaded once at startup and kept up to date by the join, create group and delete group paths.
+    """
+    def __init__(self):
+        self._groups: tp.Dict[int, tp.List[Membership]] = {}
+        self._users: tp.Dict[int, tp.Dict[int, None]] = {}
+
+    async def load(self, pg_con: PostgresConnection) -> None:
+        groups: tp.Dict[int, tp.Dict[int, Membership]] = {}
+        users: tp.Dict[int, tp.Dict[int, None]] = {}
+        # Grows with users x groups, so it is streamed instead of being fetched as one list
+        async for record in pg_con.iterate_data(queries.MEMBERSHIPS, MAX_WINDOW, primary=True):
+            groups.setdefault(record['group_id'], {}).setdefault(record['competition_id'],
+                                                                 Membership.from_record(record))
+            users.setdefault(record['user_id'], {})[record['group_id']] = None
+        self._groups = {group_id: list(memberships.values()) for group_id, memberships in groups.items()}
+        self._users = users
+        logger.info(f'Membership index loaded: {len(self._users)} users in {len(self._groups)} groups')
+
+    async def _load_group(self, pg_con: PostgresConnection, group_id: int) -> tp.List[Membership]:
+        if group_id not in self._groups:
+            records = await pg_con.get_records(queries.GROUP_COMPETITIONS, group_id, primary=True)
+            self._groups[group_id] = [Membership.from_record(record) for record in records]
+        return self._groups[group_id]
+
+    def get(self, user_id: int, window: datetime.timedelta) -> tp.List[Membership]:
+        """
+        Returns the user's memberships in competitions that ended less than window ago (or haven't ended).
+        """
+        result = []
+        for group_id in self._users.get(user_id, ()):
+            for membership in self._groups.get(group_id, ()):
+                if datetime.datetime.now(membership.end_date.tzinfo) - membership.end_date < window:
+                    result.append(membership)
+        return result
+
+    def competitions(self, user_id: int, window: datetime.timedelta) -> tp.List[tp.Tuple[int, str]]:
+        """
+        Returns distinct (competition id, competition name) pairs of the user's memberships, see get.
+        """
+        return list(dict.fromkeys((membership.competition_id, membership.competition_name)
+                                  for membership in self.get(user_id, window)))
+
+    def is_member(self, user_id: int, group_id: int) -> bool:
+        return group_id in self._users.get(user_id, ())
+
+    async def add_member(self, pg_con: PostgresConnection, user_id: int, group_id: int) -> None:
+        await self._load_group(pg_con, group_id)
+        self._users.setdefault(user_id, {})[group_id] = None
+
+    def remove_member(self, user_id: int, group_id: int) -> None:
+        self._users.get(user_id, {}).pop(group_id, None)
+
+    def remove_group(self, group_id: int) -> None:
+        self._groups.pop(group_id, None)
+        for groups in self._users.values():
+            groups.pop(group_id, None)
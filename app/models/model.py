@@ -1,16 +1,41 @@
 from __future__ import annotations
 import dataclasses
-from app.dbworker.dbworker import PostgresConnection
-from app.utils.utilities import logger
+import datetime
+import enum
+import typing as tp
+
+import asyncpg
+
+from app.dbworker import PostgresConnection, queries, group_tag
+from app.utils.utilities import logger, BoundedSet
+
+
+class Row:
+    """
+    Base for the slotted row models: fields follow the table's column order, so instances can be passed to
+    PostgresConnection.insert_data as they are.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def columns(cls) -> tp.List[str]:
+        return [field.name for field in dataclasses.fields(cls)]
+
+    @classmethod
+    def from_record(cls, record: asyncpg.Record):
+        return cls(**{column: record[column] for column in cls.columns()})
 
 
 @dataclasses.dataclass
-class User:
+class User(Row):
+    __slots__ = ('id', 'first_name', 'last_name', 'nickname')
     id: int
     first_name: str
     last_name: str
     nickname: str
 
+    known_users = BoundedSet(max_size=100_000)
+
     @classmethod
     def from_id(cls, row: tuple) -> User:
         return cls(
@@ -20,25 +45,28 @@ class User:
             nickname=str(row[3])
         )
 
-    async def check_existing(self, pg_con: PostgresConnection) -> None:
-        query = f"""
-        select 
-                id
-        from 
-                bets.users
-        where 
-                id = '{self.id}'
+    async def register(self, pg_con: PostgresConnection) -> None:
+        """
+        Creates the user unless it exists, with a single idempotent upsert. Users already seen by this process are
+        skipped without touching the database.
         """
-        if await pg_con.get_data(query):
-            pass
-        else:
-            await pg_con.insert_data('bets.users', ['id', 'first_name', 'last_name', 'nickname'],
-                                     [(self.id, self.first_name, self.last_name, self.nickname)])
+        if self.id in User.known_users:
+            return
+        status = await pg_con.execute(queries.UPSERT_USER, self.id, self.first_name, self.last_name, self.nickname)
+        User.known_users.add(self.id)
+        if status == 'INSERT 0 1':
             logger.info(f'User {self.nickname} created')
 
 
+class JoinStatus(enum.Enum):
+    JOINED = 'joined'
+    ALREADY_MEMBER = 'already_member'
+    NOT_JOINABLE = 'not_joinable'
+
+
 @dataclasses.dataclass
-class UserInGroup:
+class UserInGroup(Row):
+    __slots__ = ('user_id', 'group_id', 'added_by', 'is_admin')
     user_id: int
     group_id: int
     added_by: int
@@ -53,36 +81,49 @@ class UserInGroup:
             is_admin=False
         )
 
-    async def check_existing_group(self, pg_con: PostgresConnection) -> bool:
-        query = f"""
-        select 
-                id
-        from 
-                bets.groups
-        where 
-                id = {self.group_id}
-                and not exists (select 1 from bets.groups_in_competitions as gic join
-                 bets.competitions as cmp on cmp.id = gic.competition_id where  now() > cmp.start_date and gic.group_id 
-                 = bets.groups.id )
+    async def join(self, pg_con: PostgresConnection) -> JoinStatus:
         """
-        if await pg_con.get_data(query):
-            return True
-        return False
-
-    async def check_existing(self, pg_con: PostgresConnection) -> None:
-        query = f"""
-        select 
-                id
-        from 
-                bets.users_in_groups
-        where 
-                user_id = {self.user_id}
-                and group_id = {self.group_id}
+        Adds the user to the group in one atomic statement, if the group exists and its competition hasn't started.
+        A membership that already exists, even one inserted by a concurrent join, gives ALREADY_MEMBER.
         """
-        if await pg_con.get_data(query):
-            pass
-        else:
-            await pg_con.insert_data('bets.users_in_groups',
-                                     ['user_id', 'group_id', 'added_by', 'is_admin'],
-                                     [(self.user_id, self.group_id, self.added_by, self.is_admin)])
+        rows = await pg_con.execute_fetch(queries.JOIN_GROUP, self.user_id, self.group_id, self.added_by)
+        status = JoinStatus(rows[0]['status'])
+        if status == JoinStatus.JOINED:
+            pg_con.invalidate(group_tag(self.group_id))
             logger.info(f'User {self.user_id} added to group {self.group_id}')
+        return status
+
+
+@dataclasses.dataclass
+class Group(Row):
+    __slots__ = ('id', 'name')
+    id: int
+    name: str
+
+
+@dataclasses.dataclass
+class Match(Row):
+    __slots__ = ('id', 'competition_id', 'first_team', 'second_team', 'stage', 'dt', 'first_team_goals',
+                 'second_team_goals', 'penalty_winner')
+    id: int
+    competition_id: int
+    first_team: str
+    second_team: str
+    stage: str
+    dt: datetime.datetime
+    first_team_goals: tp.Optional[int]
+    second_team_goals: tp.Optional[int]
+    penalty_winner: tp.Optional[int]
+
+
+@dataclasses.dataclass
+class Bet(Row):
+    __slots__ = ('match_id', 'user_id', 'first_team_goals', 'second_team_goals', 'penalty_winner', 'group_id',
+                 'competition_id')
+    match_id: int
+    user_id: int
+    first_team_goals: int
+    second_team_goals: int
+    penalty_winner: int
+    group_id: int
+    competition_id: int
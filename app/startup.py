@@ -0,0 +1,143 @@
+import json
+import logging
+import sys
+import time
+import typing as tp
+from datetime import datetime
+from importlib.abc import MetaPathFinder
+from importlib.machinery import ExtensionFileLoader, ModuleSpec, SourceFileLoader, SourcelessFileLoader
+
+# Deliberately free of aiogram and app.utils imports: this module is imported first, so it can time everything else
+logger = logging.getLogger()
+
+FILE_LOADERS = (SourceFileLoader, SourcelessFileLoader, ExtensionFileLoader)
+
+
+class ImportTimer(MetaPathFinder):
+    """
+    Times imports of top-level packages while installed in sys.meta_path.
+
+    Times are exclusive: a package imported while another one loads is counted under its own name only, so the times
+    add up to the total import time.
+    """
+    def __init__(self):
+        self.times: tp.Dict[str, float] = {}
+        self._children: tp.List[float] = []
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname: str, path: tp.Optional[tp.Sequence[str]],
+                  target: tp.Optional[tp.Any] = None) -> tp.Optional[ModuleSpec]:
+        if path is not None:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        # Builtin and frozen loaders are shared classes, only per-module file loaders are safe to patch
+        if isinstance(spec.loader, FILE_LOADERS):
+            self._wrap(spec.loader, fullname)
+        return spec
+
+    def _wrap(self, loader: tp.Any, name: str) -> None:
+        exec_module = loader.exec_module
+
+        def timed_exec_module(module) -> None:
+            self._children.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = self._children.pop()
+                self.times[name] = self.times.get(name, 0.0) + elapsed - children
+                if self._children:
+                    self._children[-1] += elapsed
+
+        loader.exec_module = timed_exec_module
+
+    def breakdown(self, top: int = 8) -> tp.Dict[str, float]:
+        """
+        The top slowest packages, with the rest summed up under 'other'.
+        """
+        ranked = sorted(self.times.items(), key=lambda item: item[1], reverse=True)
+        result = {name: round(seconds, 3) for name, seconds in ranked[:top]}
+        if len(ranked) > top:
+            result['other'] = round(sum(seconds for _, seconds in ranked[top:]), 3)
+        return result
+
+
+class StartupReport:
+    """
+    Records how long the bot takes to start: the import-time breakdown, the startup phases marked by bot.py and the
+    time until the first update is handled, all counted from when this module was imported.
+
+    The report is logged once the first update is handled and, with log_path set, appended to that file as a JSON
+    line, so startup times can be compared between releases.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = ImportTimer()
+        self.phases: tp.Dict[str, float] = {}
+        self.log_path: tp.Optional[str] = None
+        self.release: tp.Optional[str] = None
+        self._reported = False
+
+    def configure(self, log_path: tp.Optional[str], release: tp.Optional[str]) -> None:
+        self.log_path = log_path
+        self.release = release
+
+    def mark(self, phase: str) -> None:
+        """
+        Records that a phase of startup is done. Marking 'imports' also stops timing imports.
+
+        :param phase: Name of the phase.
+        """
+        if phase == 'imports':
+            self.imports.uninstall()
+        self.phases[phase] = round(time.perf_counter() - self.started, 3)
+        logger.info(f'Startup: {phase} after {self.phases[phase]:.3f}s')
+
+    async def first_update_middleware(self, handler: tp.Callable[[tp.Any, tp.Dict[str, tp.Any]], tp.Awaitable],
+                                      event: tp.Any, data: tp.Dict[str, tp.Any]) -> tp.Any:
+        """
+        Outer update middleware that marks the first handled update and writes the report.
+        """
+        try:
+            return await handler(event, data)
+        finally:
+            if not self._reported:
+                self._reported = True
+                self.mark('first update handled')
+                self.report()
+
+    def as_dict(self) -> tp.Dict[str, tp.Any]:
+        return {'timestamp': datetime.now().isoformat(timespec='seconds'), 'release': self.release,
+                'python': sys.version.split()[0], 'imports': self.imports.breakdown(), 'phases': self.phases}
+
+    def report(self) -> None:
+        report = self.as_dict()
+        imports = ', '.join(f'{name} {seconds:.3f}s' for name, seconds in report['imports'].items())
+        phases = ', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in report['phases'].items())
+        logger.info(f'Startup report: phases: {phases}; imports: {imports}')
+        if self.log_path is None:
+            return
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(report) + '\n')
+        except OSError as e:
+            logger.error(f'Could not write startup report to {self.log_path}: {e}')
+
+
+startup_report = StartupReport()
+startup_report.imports.install()
@@ -1 +1,7 @@
 from .utilities import *
+from .renderers import Renderer, RENDERERS, TableStyle, EncodeOptions, get_renderer, render_backend
+from .render_cache import RenderCache, render_cache, render_key
+from .render_pool import RenderPool, render_pool
+from .text_tables import OutputModes, output_modes, TEXT_TABLES
+from .photos import FileIdCache, file_ids, send_table
+from .prerender import Prerenderer
@@ -0,0 +1,96 @@
+import typing as tp
+from collections import OrderedDict
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest
+
+from app.utils.render_cache import render_cache
+from app.utils.render_pool import prepare, render_png, render_pool
+from app.utils.text_tables import TEXT_TABLES, output_modes
+from app.utils.utilities import logger
+
+
+class FileIdCache:
+    """
+    Telegram file_ids of images already uploaded by the bot, keyed by the image's content hash, so the same image is
+    sent by reference instead of being uploaded again. Keeps at most max_entries most recently used ids.
+    """
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.uploads = 0
+        self._ids: tp.OrderedDict[str, str] = OrderedDict()
+
+    def get(self, key: str) -> tp.Optional[str]:
+        file_id = self._ids.get(key)
+        if file_id is not None:
+            self._ids.move_to_end(key)
+        return file_id
+
+    def set(self, key: str, file_id: str) -> None:
+        self._ids[key] = file_id
+        self._ids.move_to_end(key)
+        while len(self._ids) > self.max_entries:
+            self._ids.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        self._ids.pop(key, None)
+
+    def stats(self) -> tp.Dict[str, int]:
+        return {'entries': len(self._ids), 'hits': self.hits, 'uploads': self.uploads}
+
+
+file_ids = FileIdCache()
+
+
+async def send_table(bot: Bot, chat_id: int, fn: tp.Callable[[tp.List[tp.List], str], bytes],
+                     table_data: tp.Sequence[tp.Sequence], name: str, caption: str,
+                     reply_markup: tp.Optional[types.InlineKeyboardMarkup] = None) -> types.Message:
+    """
+    Sends a table drawn by one of the make_plot_* functions. An image Telegram already has is sent by its file_id,
+    otherwise it is rendered (or taken from the render cache), uploaded and its file_id remembered.
+
+    Chats that chose text mode get the table as text, and so does everyone else while the render pool is saturated
+    and the image is neither on Telegram nor in the render cache. Tables too large for a message are always sent as
+    images.
+
+    :param bot: The bot to send with.
+    :param chat_id: The chat to send to.
+    :param fn: The make_plot_* function.
+    :param table_data: Header row followed by data rows.
+    :param name: Title of the image.
+    :param caption: Caption of the message.
+    :param reply_markup: Keyboard attached to the message.
+    """
+    key, table = prepare(fn, table_data, name)
+    if output_modes.prefers_text(chat_id):
+        text = TEXT_TABLES[fn](table, name)
+        if text is not None:
+            return await bot.send_message(chat_id, text, parse_mode='HTML', reply_markup=reply_markup)
+
+    file_id = file_ids.get(key)
+    if file_id is not None:
+        try:
+            message = await bot.send_photo(chat_id, file_id, caption=caption, reply_markup=reply_markup)
+            file_ids.hits += 1
+            return message
+        except TelegramBadRequest as e:
+            logger.info(f'Stored file_id for image {key[:12]} was rejected, uploading again: {e}')
+            file_ids.discard(key)
+
+    image = None
+    if render_pool.saturated:
+        # An image that is already drawn, e.g. by the pre-renderer, is still sent as an image
+        image = await render_cache.get(key)
+        text = TEXT_TABLES[fn](table, name) if image is None else None
+        if text is not None:
+            return await bot.send_message(chat_id, text, parse_mode='HTML', reply_markup=reply_markup)
+    if image is None:
+        image = await render_png(key, fn, table, name)
+    message = await bot.send_photo(chat_id, types.BufferedInputFile(image, 'file.png'), caption=caption,
+                                   reply_markup=reply_markup)
+    file_ids.uploads += 1
+    if message.photo:
+        # The largest size is the original upload
+        file_ids.set(key, message.photo[-1].file_id)
+    return message
@@ -0,0 +1,109 @@
+import asyncio
+import functools
+import typing as tp
+
+from app.dbworker import PostgresConnection, queries
+from app.utils.render_pool import prepare, render_png
+from app.utils.utilities import (logger, make_plot_points, make_plot_points_detailed, make_plot_two_teams,
+                                 fetch_points, fetch_points_page, fetch_stage_matches, stage_matches_title,
+                                 POINTS_TITLE)
+
+
+class Prerenderer:
+    """
+    Draws the leaderboards and stage tables of a competition right after the parser updates its matches, so the first
+    /check_leaders after a match is served from the render cache.
+
+    Registered as an invalidation hook for NOTIFYs only: a 'competition:<id>' tag from the parser schedules the
+    competition after delay seconds, which also folds the parser's burst of notifications into one run. Local writes,
+    like creating or deleting a group, invalidate the same tag but don't change any table worth drawing ahead.
+
+    Data is read from the primary, since a replica may not have the parser's changes yet. The render cache is keyed by
+    content, so an image drawn here is only ever served for exactly the data it was drawn from, and needs no
+    invalidation of its own.
+    """
+    def __init__(self, pg_con: PostgresConnection, delay: float = 5.0, concurrency: int = 2):
+        self.pg_con = pg_con
+        self.delay = delay
+        self.concurrency = concurrency
+        self.rendered = 0
+        self._pending: tp.Dict[int, asyncio.Task] = {}
+        self._slots: tp.Optional[asyncio.Semaphore] = None
+
+    def on_invalidate(self, *tags: str) -> None:
+        for tag in tags:
+            kind, _, value = tag.partition(':')
+            if kind != 'competition' or int(value) in self._pending:
+                continue
+            self._pending[int(value)] = asyncio.get_running_loop().create_task(self._run(int(value)))
+
+    async def _run(self, competition_id: int) -> None:
+        try:
+            await asyncio.sleep(self.delay)
+            del self._pending[competition_id]
+            await self.prerender(competition_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f'Pre-rendering competition {competition_id} failed: {e}')
+        finally:
+            self._pending.pop(competition_id, None)
+
+    async def prerender(self, competition_id: int) -> None:
+        """
+        Renders the simple and the first page of the detailed leaderboard of every group in the competition and the
+        table of every stage, at most concurrency at a time, to leave database connections and render workers free for
+        users.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        groups = await self.pg_con.get_records(queries.COMPETITION_GROUPS, competition_id, primary=True)
+        if not groups:
+            return
+        stages = await self.pg_con.get_records(queries.COMPETITION_STAGES, competition_id, primary=True)
+
+        jobs = [functools.partial(self._stage, competition_id, groups[0]['competition_name'], stage['stage'])
+                for stage in stages]
+        for group in groups:
+            jobs.append(functools.partial(self._points, competition_id, group['group_id']))
+            jobs.append(functools.partial(self._points_page, competition_id, group['group_id']))
+        results = await asyncio.gather(*(self._limited(job) for job in jobs), return_exceptions=True)
+        failed = [result for result in results if isinstance(result, Exception)]
+        if failed:
+            logger.error(f'{len(failed)} of {len(jobs)} pre-renders of competition {competition_id} failed: '
+                         f'{failed[0]}')
+        logger.info(f'Pre-rendered {len(jobs) - len(failed)} tables of competition {competition_id} '
+                    f'for {len(groups)} groups')
+
+    async def _limited(self, job: tp.Callable[[], tp.Awaitable[None]]) -> None:
+        # The whole job holds a slot, so a competition with many groups doesn't queue its reads ahead of users' for
+        # a database connection either
+        async with self._slots:
+            await job()
+
+    async def _render(self, fn: tp.Callable[[tp.List[tp.List], str], bytes], table: tp.Optional[tp.List[tp.List]],
+                      name: str) -> None:
+        if table is None:
+            return
+        key, table = prepare(fn, table, name)
+        await render_png(key, fn, table, name)
+        self.rendered += 1
+
+    async def _stage(self, competition_id: int, competition_name: str, stage: str) -> None:
+        table = await fetch_stage_matches(self.pg_con, competition_id, stage, primary=True)
+        await self._render(make_plot_two_teams, table, stage_matches_title(competition_name, stage))
+
+    async def _points(self, competition_id: int, group_id: int) -> None:
+        table = await fetch_points(self.pg_con, competition_id, group_id, primary=True)
+        await self._render(make_plot_points, table, POINTS_TITLE)
+
+    async def _points_page(self, competition_id: int, group_id: int) -> None:
+        points_page = await fetch_points_page(self.pg_con, competition_id, group_id, 0, primary=True)
+        if points_page is not None:
+            table, title, _ = points_page
+            await self._render(make_plot_points_detailed, table, title)
+
+    def shutdown(self) -> None:
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import os
+import threading
+import typing as tp
+from collections import OrderedDict
+
+from app.utils.utilities import logger
+
+
+def render_key(kind: str, table_data: tp.List[tp.List], name: str) -> str:
+    """
+    Content hash of a render: the same renderer, title and table always produce the same image.
+    """
+    return hashlib.sha256(repr((kind, name, table_data)).encode()).hexdigest()
+
+
+class RenderCache:
+    """
+    Rendered PNGs keyed by render_key, evicted least recently used once they take more than max_bytes.
+
+    With disk_dir set, images are also written there and memory misses fall back to it, so they survive restarts;
+    the directory is trimmed to max_disk_bytes by file age. Its files are listed once, when the directory is set, and
+    tracked in memory from then on, so a write only touches the files it adds or evicts.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, disk_dir: tp.Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: tp.OrderedDict[str, bytes] = OrderedDict()
+        # Disk writes run in executor threads
+        self._disk_lock = threading.Lock()
+        self._disk_size = 0
+        self._disk_files: tp.OrderedDict[str, int] = OrderedDict()
+        self._scan_disk()
+
+    def configure(self, max_bytes: int, disk_dir: tp.Optional[str], max_disk_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._scan_disk()
+
+    def _scan_disk(self) -> None:
+        """
+        Lists the images already in disk_dir, oldest first, and trims them to max_disk_bytes.
+        """
+        with self._disk_lock:
+            self._disk_files.clear()
+            self._disk_size = 0
+            if self.disk_dir is None:
+                return
+            os.makedirs(self.disk_dir, exist_ok=True)
+            files = []
+            with os.scandir(self.disk_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.png'):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.name[:-len('.png')], stat.st_size))
+            for _, key, size in sorted(files):
+                self._disk_files[key] = size
+                self._disk_size += size
+            self._trim_disk()
+
+    async def get(self, key: str) -> tp.Optional[bytes]:
+        image = self._entries.get(key)
+        if image is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+        if self.disk_dir is not None:
+            image = await asyncio.get_running_loop().run_in_executor(None, self._read, key)
+            if image is not None:
+                self.disk_hits += 1
+                self._remember(key, image)
+                return image
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, image: bytes) -> None:
+        self._remember(key, image)
+        if self.disk_dir is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, key, image)
+
+    def _remember(self, key: str, image: bytes) -> None:
+        if len(image) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = image
+        self._size += len(image)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f'{key}.png')
+
+    def _read(self, key: str) -> tp.Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, key: str, image: bytes) -> None:
+        tmp_path = f'{self._path(key)}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.error(f'Could not write rendered image to {self.disk_dir}: {e}')
+            return
+        with self._disk_lock:
+            self._disk_size += len(image) - self._disk_files.pop(key, 0)
+            self._disk_files[key] = len(image)
+            self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        """
+        Removes the oldest images until the directory fits into max_disk_bytes. Called with _disk_lock held.
+        """
+        while self._disk_size > self.max_disk_bytes and self._disk_files:
+            key, size = self._disk_files.popitem(last=False)
+            self._disk_size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f'Could not remove rendered image from {self.disk_dir}: {e}')
+
+    def stats(self) -> tp.Dict[str, int]:
+        return {'entries': len(self._entries), 'bytes': self._size, 'hits': self.hits, 'disk_hits': self.disk_hits,
+                'misses': self.misses, 'disk_bytes': self._disk_size}
+
+
+render_cache = RenderCache()
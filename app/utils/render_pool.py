@@ -0,0 +1,150 @@
+import asyncio
+import multiprocessing
+import resource
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+
+from app.dbworker.singleflight import SingleFlight
+from app.utils.render_cache import render_cache, render_key
+from app.utils.renderers import get_renderer, render_signature
+from app.utils.utilities import logger
+
+
+def _init_worker() -> None:
+    # Pay for loading the renderer once per worker instead of on its first render
+    get_renderer()
+
+
+def _run(fn: tp.Callable[..., bytes], args: tp.Tuple) -> tp.Tuple[bytes, int]:
+    """
+    Runs the render in the worker and reports the worker's peak RSS in kilobytes along with the result.
+    """
+    result = fn(*args)
+    return result, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _ready() -> None:
+    pass
+
+
+class RenderPool:
+    """
+    Runs image renders in worker processes, so matplotlib doesn't block the event loop.
+
+    Workers are recycled by swapping the executor for a fresh one after max_tasks renders per worker on average, or as
+    soon as a worker reports a peak RSS above max_worker_rss_mb. Tasks already running on the old executor finish
+    there. At most max_queue renders are in flight at once; further callers wait for a slot.
+    """
+    def __init__(self, workers: int = 2, max_tasks: int = 200, max_worker_rss_mb: int = 512, max_queue: int = 16):
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self.max_worker_rss_mb = max_worker_rss_mb
+        self.max_queue = max_queue
+        self.rendered = 0
+        self.recycled = 0
+        self._in_flight = 0
+        self._tasks = 0
+        self._executor: tp.Optional[ProcessPoolExecutor] = None
+        self._slots: tp.Optional[asyncio.Semaphore] = None
+
+    def configure(self, workers: int, max_tasks: int, max_worker_rss_mb: int, max_queue: int) -> None:
+        self.shutdown()
+        self.workers = workers
+        self.max_tasks = max_tasks
+        self.max_worker_rss_mb = max_worker_rss_mb
+        self.max_queue = max_queue
+        self._slots = None
+
+    @property
+    def saturated(self) -> bool:
+        """
+        True when every slot is taken and a new render would have to wait.
+        """
+        return self._in_flight >= self.max_queue
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker)
+            self._tasks = 0
+        return self._executor
+
+    def _recycle(self, reason: str) -> None:
+        if self._executor is None:
+            return
+        logger.info(f'Recycling render workers: {reason}')
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        self.recycled += 1
+
+    async def submit(self, fn: tp.Callable[..., bytes], *args) -> bytes:
+        """
+        Runs fn(*args) in a worker process and returns its result. fn and args must be picklable.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+        self._in_flight += 1
+        try:
+            async with self._slots:
+                executor = self._get_executor()
+                future = asyncio.get_running_loop().run_in_executor(executor, _run, fn, args)
+                self._tasks += 1
+                if self._tasks >= self.workers * self.max_tasks:
+                    # Detach the executor only once this render is scheduled on it: a shut down executor accepts no
+                    # new work, but finishes what it already has
+                    self._recycle(f'{self._tasks} tasks')
+                result, rss_kb = await future
+        finally:
+            self._in_flight -= 1
+        self.rendered += 1
+        if rss_kb > self.max_worker_rss_mb * 1024 and executor is self._executor:
+            self._recycle(f'worker peak RSS {rss_kb // 1024} MB')
+        return result
+
+    async def warm_up(self) -> None:
+        """
+        Starts every worker ahead of the first render, so the first /check_leaders doesn't wait for worker processes
+        to spawn and load the renderer.
+        """
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(executor, _ready) for _ in range(self.workers)))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> tp.Dict[str, int]:
+        return {'rendered': self.rendered, 'recycled': self.recycled, 'in_flight': self._in_flight}
+
+
+render_pool = RenderPool()
+_renders = SingleFlight()
+
+
+def prepare(fn: tp.Callable[[tp.List[tp.List], str], bytes], table_data: tp.Sequence[tp.Sequence],
+            name: str) -> tp.Tuple[str, tp.List[tp.List]]:
+    """
+    Converts database records to plain lists for pickling and returns them with the content hash of the image.
+    """
+    table = [list(row) for row in table_data]
+    return render_key(f'{render_signature()}:{fn.__module__}.{fn.__qualname__}', table, name), table
+
+
+async def render_png(key: str, fn: tp.Callable[[tp.List[tp.List], str], bytes], table: tp.List[tp.List],
+                     name: str) -> bytes:
+    """
+    Renders a prepared table in the render pool, or takes the image from the render cache when the same table was
+    already drawn. Concurrent requests for the same image share one render.
+    """
+    async def render_once() -> bytes:
+        image = await render_cache.get(key)
+        if image is None:
+            image = await render_pool.submit(fn, table, name)
+            await render_cache.set(key, image)
+        return image
+
+    return await _renders.do(key, render_once)
+
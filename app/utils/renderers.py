@@ -0,0 +1,294 @@
+import abc
+import dataclasses
+import importlib.util
+import io
+import os
+import typing as tp
+from collections import OrderedDict
+
+# Anchors of matplotlib's RdYlGn colormap, from red (0) through yellow to green (1)
+_RD_YL_GN = [(165, 0, 38), (215, 48, 39), (244, 109, 67), (253, 174, 97), (254, 224, 139), (255, 255, 191),
+             (217, 239, 139), (166, 217, 106), (102, 189, 99), (26, 152, 80), (0, 104, 55)]
+
+
+def rd_yl_gn(value: float) -> str:
+    """
+    Colour of a value in [0, 1] on the red-yellow-green scale, as a hex string both backends understand.
+    """
+    position = min(max(value, 0.0), 1.0) * (len(_RD_YL_GN) - 1)
+    k = min(int(position), len(_RD_YL_GN) - 2)
+    fraction = position - k
+    low, high = _RD_YL_GN[k], _RD_YL_GN[k + 1]
+    return '#' + ''.join(f'{round(a + (b - a) * fraction):02x}' for a, b in zip(low, high))
+
+
+@dataclasses.dataclass(frozen=True)
+class TableStyle:
+    """
+    figsize is the largest canvas in inches; smaller tables get a canvas fitted to their shape.
+    """
+    figsize: tp.Tuple[float, float]
+    dpi: int
+    fontsize: int
+    scale: tp.Tuple[float, float]
+
+
+@dataclasses.dataclass(frozen=True)
+class EncodeOptions:
+    """
+    :param png_colors: Quantize images to a palette of this many colours; 0 keeps full colour.
+    :param max_bytes: Downscale images until the PNG fits; 0 for no limit.
+    """
+    png_colors: int = 64
+    max_bytes: int = 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> 'EncodeOptions':
+        return cls(png_colors=int(os.environ.get('RENDER_png_colors', cls.png_colors)),
+                   max_bytes=int(os.environ.get('RENDER_max_bytes', cls.max_bytes)))
+
+
+# Smallest side an image is downscaled to when it doesn't fit into max_bytes
+_MIN_SIDE = 400
+
+
+def encode_png(image: tp.Any, options: EncodeOptions) -> bytes:
+    """
+    Encodes a Pillow image as a PNG, palette-quantized when options.png_colors is set. Tables are a handful of flat
+    colours plus anti-aliased text, so a small palette loses nothing visible and shrinks the file several times.
+    """
+    image = image.convert('RGB')
+    while True:
+        # Fast octree is several times quicker than the default median cut, and just as good for flat colours
+        encoded = image.quantize(colors=options.png_colors, method=2) if options.png_colors else image
+        buf = io.BytesIO()
+        encoded.save(buf, format='png')
+        if not options.max_bytes or buf.tell() <= options.max_bytes or min(image.size) <= _MIN_SIDE:
+            return buf.getvalue()
+        image = image.resize((round(image.width * 0.8), round(image.height * 0.8)), resample=3)
+
+
+def fit_table(table_data: tp.List[tp.List], style: TableStyle) -> tp.Tuple[tp.Tuple[float, float], tp.List[float]]:
+    """
+    Canvas size in inches for the table, capped by style.figsize, and the relative width of each column, both
+    estimated from the length of the cell texts.
+    """
+    char_width = style.fontsize / 72 * 0.6
+    widths = [(max(len(str(row[j])) for row in table_data) * char_width + 0.3) * style.scale[0]
+              for j in range(len(table_data[0]))]
+    row_height = style.fontsize / 72 * 1.3 * style.scale[1]
+    width = min(max(sum(widths), 4.0), style.figsize[0])
+    height = min(max((len(table_data) + 2) * row_height, 2.0), style.figsize[1])
+    return (width, height), [w / sum(widths) for w in widths]
+
+
+TWO_TEAMS_STYLE = TableStyle(figsize=(12, 6), dpi=200, fontsize=11, scale=(1.2, 2))
+POINTS_STYLE = TableStyle(figsize=(10, 6), dpi=200, fontsize=12, scale=(1.2, 1.5))
+POINTS_DETAILED_STYLE = TableStyle(figsize=(30, 10), dpi=200, fontsize=11, scale=(1.2, 2))
+
+
+class Renderer(abc.ABC):
+    """
+    Draws a table as a PNG: every cell holds str(value) on a white background unless colors gives it a face colour
+    (a colour name or hex string), with the title above.
+    """
+    name = ''
+
+    def __init__(self, options: tp.Optional[EncodeOptions] = None):
+        self.options = options or EncodeOptions.from_env()
+
+    @abc.abstractmethod
+    def draw_table(self, table_data: tp.List[tp.List], colors: tp.Dict[tp.Tuple[int, int], str], title: str,
+                   style: TableStyle) -> bytes:
+        ...
+
+
+class MatplotlibRenderer(Renderer):
+    """
+    Draws with matplotlib's table. Figures are kept as templates keyed by table shape and style, up to max_templates
+    of them; rendering a table of a known shape only resizes the figure and updates cell texts, widths and colours.
+    max_templates=0 builds a new figure for every table.
+    """
+    name = 'matplotlib'
+
+    def __init__(self, options: tp.Optional[EncodeOptions] = None, max_templates: tp.Optional[int] = None):
+        super().__init__(options)
+        import matplotlib
+        matplotlib.use('Agg')
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.transforms import Bbox
+        from PIL import Image
+        self.canvas = FigureCanvasAgg
+        self.figure = Figure
+        self.bbox = Bbox
+        self.image = Image
+        self.max_templates = int(os.environ.get('RENDER_figure_templates', 8)) if max_templates is None \
+            else max_templates
+        self._templates: tp.OrderedDict[tp.Hashable, tp.Tuple[tp.Any, tp.Any, tp.Any]] = OrderedDict()
+
+    def _template(self, table_data: tp.List[tp.List], col_widths: tp.List[float], figsize: tp.Tuple[float, float],
+                  style: TableStyle) -> tp.Tuple[tp.Any, tp.Any, tp.Any, bool]:
+        key = (len(table_data), len(table_data[0]), style)
+        template = self._templates.get(key)
+        if template is not None:
+            self._templates.move_to_end(key)
+            return template + (True,)
+
+        # Figure rather than pyplot, so figures aren't registered globally and need no closing
+        fig = self.figure(figsize=figsize, dpi=style.dpi)
+        self.canvas(fig)
+        ax = fig.subplots()
+        ax.axis('off')
+
+        table = ax.table(cellText=table_data, colWidths=col_widths, loc='center', cellLoc='center')
+        table.auto_set_font_size(False)
+        table.set_fontsize(style.fontsize)
+        table.scale(*style.scale)
+        title = ax.set_title('')
+
+        if self.max_templates > 0:
+            self._templates[key] = (fig, table, title)
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return fig, table, title, False
+
+    def draw_table(self, table_data: tp.List[tp.List], colors: tp.Dict[tp.Tuple[int, int], str], title: str,
+                   style: TableStyle) -> bytes:
+        figsize, col_widths = fit_table(table_data, style)
+        fig, table, title_text, reused = self._template(table_data, col_widths, figsize, style)
+
+        if reused:
+            fig.set_size_inches(*figsize)
+            for (i, j), cell in table.get_celld().items():
+                cell.get_text().set_text(table_data[i][j])
+                cell.set_width(col_widths[j] * style.scale[0])
+                cell.set_facecolor('white')
+        for cell, color in colors.items():
+            table[cell].set_facecolor(color)
+
+        title_text.set_text(title)
+
+        # Draw once and crop to the table and title, instead of savefig(bbox_inches='tight'), which draws the figure
+        # twice and encodes a PNG that encode_png would only decode again
+        fig.canvas.draw()
+        renderer = fig.canvas.get_renderer()
+        bbox = self.bbox.union([table.get_window_extent(renderer), title_text.get_window_extent(renderer)])
+        width, height = fig.canvas.get_width_height()
+        pad = 0.2 * style.dpi
+        image = self.image.frombuffer('RGBA', (width, height), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+        image = image.crop((max(0, int(bbox.x0 - pad)), max(0, int(height - bbox.y1 - pad)),
+                            min(width, int(bbox.x1 + pad) + 1), min(height, int(height - bbox.y0 + pad) + 1)))
+        return encode_png(image, self.options)
+
+
+def _load_font(size: int) -> tp.Any:
+    from PIL import ImageFont
+
+    # DejaVu Sans is what matplotlib draws with; it ships with matplotlib, so it's found even without system fonts
+    candidates = ['DejaVuSans.ttf']
+    spec = importlib.util.find_spec('matplotlib')
+    if spec is not None and spec.submodule_search_locations:
+        candidates.append(os.path.join(list(spec.submodule_search_locations)[0], 'mpl-data', 'fonts', 'ttf',
+                                       'DejaVuSans.ttf'))
+    for path in candidates:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+class NativeRenderer(Renderer):
+    """
+    Draws the grid directly with Pillow, skipping matplotlib's figure and artist machinery. The canvas fits the table.
+    """
+    name = 'native'
+
+    def __init__(self, options: tp.Optional[EncodeOptions] = None):
+        super().__init__(options)
+        from PIL import Image, ImageDraw
+        self.image = Image
+        self.image_draw = ImageDraw
+        self._fonts: tp.Dict[int, tp.Any] = {}
+
+    def _font(self, size: int) -> tp.Any:
+        if size not in self._fonts:
+            self._fonts[size] = _load_font(size)
+        return self._fonts[size]
+
+    def draw_table(self, table_data: tp.List[tp.List], colors: tp.Dict[tp.Tuple[int, int], str], title: str,
+                   style: TableStyle) -> bytes:
+        # Same point sizes as matplotlib at the style's dpi
+        font_px = round(style.fontsize * style.dpi / 72)
+        font, title_font = self._font(font_px), self._font(round(font_px * 1.1))
+        padding, margin = font_px // 2, font_px
+        row_height = round(font_px * 0.9 * style.scale[1])
+
+        # None shows as an empty cell, like in matplotlib
+        texts = [['' if cell is None else str(cell) for cell in row] for row in table_data]
+        measure = self.image_draw.Draw(self.image.new('RGB', (1, 1)))
+        widths = [round(max(measure.textlength(row[j], font=font) for row in texts) * style.scale[0]) + 2 * padding
+                  for j in range(len(texts[0]))]
+        title_height = round(font_px * 2.2)
+
+        width = max(sum(widths), round(measure.textlength(title, font=title_font))) + 2 * margin
+        height = title_height + row_height * len(texts) + 2 * margin
+        image = self.image.new('RGB', (width, height), 'white')
+        draw = self.image_draw.Draw(image)
+
+        self._centered(draw, width / 2, margin + title_height / 2, title, title_font)
+        left = (width - sum(widths)) // 2
+        y = margin + title_height
+        for i, row in enumerate(texts):
+            x = left
+            for j, text in enumerate(row):
+                draw.rectangle((x, y, x + widths[j], y + row_height), fill=colors.get((i, j), 'white'),
+                               outline='black')
+                self._centered(draw, x + widths[j] / 2, y + row_height / 2, text, font)
+                x += widths[j]
+            y += row_height
+
+        return encode_png(image, self.options)
+
+    @staticmethod
+    def _centered(draw: tp.Any, x: float, y: float, text: str, font: tp.Any) -> None:
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        draw.text((x - (right - left) / 2 - left, y - (bottom - top) / 2 - top), text, fill='black', font=font)
+
+
+RENDERERS: tp.Dict[str, tp.Type[Renderer]] = {
+    MatplotlibRenderer.name: MatplotlibRenderer,
+    NativeRenderer.name: NativeRenderer,
+}
+
+_renderer: tp.Optional[Renderer] = None
+
+
+def render_backend() -> str:
+    """
+    The backend picked by the RENDER_BACKEND env var, matplotlib by default. Render workers inherit the environment,
+    so they draw with the same backend.
+    """
+    name = os.environ.get('RENDER_BACKEND', MatplotlibRenderer.name)
+    if name not in RENDERERS:
+        raise ValueError(f'Unknown RENDER_BACKEND {name!r}, expected one of {sorted(RENDERERS)}')
+    return name
+
+
+def render_signature() -> str:
+    """
+    Backend and encoding settings, which together with the table decide what image is produced.
+    """
+    options = EncodeOptions.from_env()
+    return f'{render_backend()}:{options.png_colors}:{options.max_bytes}'
+
+
+def get_renderer() -> Renderer:
+    global _renderer
+    if _renderer is None:
+        _renderer = RENDERERS[render_backend()]()
+    return _renderer
@@ -0,0 +1,148 @@
+import asyncio
+import html
+import json
+import os
+import typing as tp
+
+from app.utils.utilities import (make_plot_two_teams, make_plot_points, make_plot_points_detailed, two_teams_colors,
+                                 points_table, points_detailed_levels, logger)
+
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+
+MARKERS = {'green': '🟩', 'yellow': '🟨', 'red': '🟥'}
+
+
+def _level_marker(level: float) -> str:
+    if level < 1 / 3:
+        return MARKERS['red']
+    if level < 2 / 3:
+        return MARKERS['yellow']
+    return MARKERS['green']
+
+
+def _width(text: str) -> int:
+    # Emoji markers take two monospace cells
+    return len(text) + sum(1 for marker in MARKERS.values() if text.startswith(marker))
+
+
+def _message_length(text: str) -> int:
+    # Telegram counts UTF-16 code units, the emoji markers are two each
+    return len(text.encode('utf-16-le')) // 2
+
+
+def format_table(table_data: tp.List[tp.List], markers: tp.Dict[tp.Tuple[int, int], str], title: str,
+                 keep_last_row: bool = False, columns_first: bool = False) -> tp.Optional[str]:
+    """
+    Lays the table out as an HTML <pre> block for parse_mode='HTML'. Coloured cells get an emoji marker in front.
+    Rows are dropped from the bottom and columns from the right until the message fits into Telegram's limit.
+
+    :param table_data: Header row followed by data rows.
+    :param markers: Emoji marker of each coloured (row, column) cell.
+    :param title: Shown in bold above the table.
+    :param keep_last_row: Drop rows before the last one, e.g. to keep the totals.
+    :param columns_first: Drop columns before rows, for tables that grow sideways.
+    :return: The message, or None when even a single cell of data doesn't fit.
+    """
+    cells = [[markers.get((i, j), '') + ('-' if cell is None else str(cell)) for j, cell in enumerate(row)]
+             for i, row in enumerate(table_data)]
+    while True:
+        widths = [max(_width(row[j]) for row in cells) for j in range(len(cells[0]))]
+        lines = [' '.join(cell + ' ' * (widths[j] - _width(cell)) for j, cell in enumerate(row)).rstrip()
+                 for row in cells]
+        text = f'<b>{html.escape(title)}</b>\n<pre>{html.escape(chr(10).join(lines))}</pre>'
+        if _message_length(text) <= MAX_MESSAGE_LENGTH:
+            return text
+        can_drop_row, can_drop_column = len(cells) > 2, len(cells[0]) > 2
+        if can_drop_column and (columns_first or not can_drop_row):
+            for row in cells:
+                del row[-1]
+        elif can_drop_row:
+            del cells[-2 if keep_last_row else -1]
+        else:
+            return None
+
+
+def text_two_teams(table_data: tp.List[tp.List], name: str) -> tp.Optional[str]:
+    markers = {cell: MARKERS[color] for cell, color in two_teams_colors(table_data).items()}
+    return format_table(table_data, markers, name)
+
+
+def text_points(table_data: tp.List[tp.List], name: str) -> tp.Optional[str]:
+    new_table, colors = points_table(table_data)
+    # One marker per row is enough in text
+    markers = {(i, j): MARKERS[color] for (i, j), color in colors.items() if j == 0}
+    return format_table(new_table, markers, name)
+
+
+def text_points_detailed(table_data: tp.List[tp.List], name: str) -> tp.Optional[str]:
+    markers = {cell: _level_marker(level) for cell, level in points_detailed_levels(table_data).items()}
+    return format_table(table_data, markers, name, keep_last_row=True, columns_first=True)
+
+
+TEXT_TABLES: tp.Dict[tp.Callable[[tp.List[tp.List], str], bytes],
+                     tp.Callable[[tp.List[tp.List], str], tp.Optional[str]]] = {
+    make_plot_two_teams: text_two_teams,
+    make_plot_points: text_points,
+    make_plot_points_detailed: text_points_detailed,
+}
+
+
+class OutputModes:
+    """
+    Chats that asked for text tables instead of images.
+
+    With path set, the chat ids are loaded from that JSON file and written back on every toggle, so the choice
+    survives restarts. The file is written off the event loop, one write at a time, and replaced atomically.
+    """
+    def __init__(self, path: tp.Optional[str] = None):
+        self._text_chats: tp.Set[int] = set()
+        self._save_lock = asyncio.Lock()
+        self.configure(path)
+
+    def configure(self, path: tp.Optional[str]) -> None:
+        self.path = path
+        if path is None:
+            return
+        try:
+            with open(path) as f:
+                self._text_chats = set(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error(f'Could not read output modes from {path}: {e}')
+
+    def prefers_text(self, chat_id: int) -> bool:
+        return chat_id in self._text_chats
+
+    async def toggle(self, chat_id: int) -> bool:
+        """
+        Switches the chat between text and images and returns True if it now gets text.
+        """
+        if chat_id in self._text_chats:
+            self._text_chats.discard(chat_id)
+        else:
+            self._text_chats.add(chat_id)
+        text = chat_id in self._text_chats
+        await self._save()
+        return text
+
+    async def _save(self) -> None:
+        if self.path is None:
+            return
+        async with self._save_lock:
+            # Snapshot under the lock, so the last write always has the latest state
+            await asyncio.to_thread(self._write, self.path, sorted(self._text_chats))
+
+    @staticmethod
+    def _write(path: str, chat_ids: tp.List[int]) -> None:
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(chat_ids, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f'Could not write output modes to {path}: {e}')
+
+
+output_modes = OutputModes()
@@ -1,17 +1,14 @@
 import hashlib
-import io
 import logging
-from collections import defaultdict
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
 import typing as tp
 
 from aiogram import types
-import matplotlib
-import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
 
-from app.dbworker import PostgresConnection
-
-matplotlib.use('Agg')
+from app.dbworker import PostgresConnection, queries, competition_tag, group_tag, COMPETITIONS_TAG
+from app.utils.renderers import get_renderer, rd_yl_gn, TWO_TEAMS_STYLE, POINTS_STYLE, POINTS_DETAILED_STYLE
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -20,6 +17,33 @@ for handler in logger.handlers:
     handler.setFormatter(formatter)
 
 
+class BoundedSet:
+    """
+    A set that keeps at most max_size most recently used items.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._items: tp.OrderedDict[tp.Hashable, None] = OrderedDict()
+
+    def __contains__(self, item: tp.Hashable) -> bool:
+        if item in self._items:
+            self._items.move_to_end(item)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item: tp.Hashable) -> None:
+        self._items[item] = None
+        self._items.move_to_end(item)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def discard(self, item: tp.Hashable) -> None:
+        self._items.pop(item, None)
+
+
 def is_integer(s: str) -> bool:
     try:
         int(s)
@@ -48,42 +72,17 @@ def get_color(row) -> tp.Tuple[str, str]:
         return 'yellow', 'yellow'
 
 
-def make_plot_two_teams(table_data: tp.List[tp.List], name: str) -> types.BufferedInputFile:
-    fig, ax = plt.subplots(figsize=(12, 6), dpi=200)
-    ax.axis('off')
-
-    table = ax.table(cellText=table_data, loc='center', cellLoc='center')
-    table.auto_set_font_size(False)
-    table.set_fontsize(11)
-    table.scale(1.2, 2)
-
+def two_teams_colors(table_data: tp.List[tp.List]) -> tp.Dict[tp.Tuple[int, int], str]:
+    colors = {}
     for i, row in enumerate(table_data[1:], start=1):
-        color1, color2 = get_color(row)
-        table[(i, 0)].set_facecolor(color1)
-        table[(i, 3)].set_facecolor(color2)
-
-    plt.title(name)
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-
-    plt.close(fig)
+        colors[(i, 0)], colors[(i, 3)] = get_color(row)
+    return colors
 
-    return types.BufferedInputFile(buf.read(), 'file.png')
-
-
-def make_plot_points(table_data: tp.List[tp.List], name: str) -> types.BufferedInputFile:
-    fig, ax = plt.subplots(figsize=(10, 6), dpi=200)
-    ax.axis('off')
 
+def points_table(table_data: tp.List[tp.List]) -> tp.Tuple[tp.List[tp.List], tp.Dict[tp.Tuple[int, int], str]]:
     new_table = [el[:3] for el in table_data]
 
-    table = ax.table(cellText=new_table, loc='center', cellLoc='center')
-    table.auto_set_font_size(False)
-    table.set_fontsize(12)
-    table.scale(1.2, 1.5)
-
+    colors = {}
     for i, row in enumerate(table_data[1:], start=1):
         if row[2] < 0:
             color = 'red'
@@ -91,123 +90,151 @@ def make_plot_points(table_data: tp.List[tp.List], name: str) -> types.BufferedI
             color = 'yellow'
         else:
             color = 'green'
-        table[(i, 0)].set_facecolor(color)
-        table[(i, 1)].set_facecolor(color)
-        table[(i, 2)].set_facecolor(color)
+        colors[(i, 0)] = colors[(i, 1)] = colors[(i, 2)] = color
+    return new_table, colors
+
 
-    plt.title(name)
+def make_plot_two_teams(table_data: tp.List[tp.List], name: str) -> bytes:
+    return get_renderer().draw_table(table_data, two_teams_colors(table_data), name, TWO_TEAMS_STYLE)
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
 
-    plt.close(fig)
+def make_plot_points(table_data: tp.List[tp.List], name: str) -> bytes:
+    new_table, colors = points_table(table_data)
+    return get_renderer().draw_table(new_table, colors, name, POINTS_STYLE)
 
-    return types.BufferedInputFile(buf.read(), 'file.png')
 
+# Pairs shown in the detailed points table
+MAX_PAIRS = 15
 
-def pivot_table(data: tp.List[tp.List]) -> tp.List[tp.List]:
-    # Step 1: Initialize defaultdicts for storing points
-    pair_points = defaultdict(lambda: defaultdict(int))
+POINTS_TITLE = "Points table"
 
-    # Step 2: Populate the defaultdicts with points
-    for row in data[1:]:
-        user_name, pair, points = row
-        pair_points[pair][user_name] += points
 
-    # Step 3: Determine all unique pairs and sort them
-    pairs = sorted(set(row[1] for row in data[1:]))
+def points_page_table(page: tp.Mapping[str, tp.Any]) -> tp.List[tp.List]:
+    """
+    The pairs x users table drawn by make_plot_points_detailed from a POINTS_DETAILED_PAGE row, which is already
+    pivoted and ordered by the database.
+    """
+    result = [['pair'] + list(page['user_names'])]
+    result.extend([pair] + list(points) for pair, points in zip(page['pairs'], page['points']))
+    result.append(['overall'] + list(page['totals']))
+    return result
 
-    # Step 4: Compute the overall points for each user
-    user_points = defaultdict(int)
-    for pair in pairs:
-        for user_name in pair_points[pair]:
-            user_points[user_name] += pair_points[pair][user_name]
 
-    # Step 5: Sort users by overall points in descending order
-    sorted_users = sorted(user_points.keys(), key=lambda user: user_points[user], reverse=True)
+def stage_matches_title(competition_name: str, stage: str) -> str:
+    return f"Matches of {competition_name} for {stage}"
 
-    # Step 6: Create the result list in the desired format
-    result = [['pair'] + sorted_users]
 
-    # Add rows for each pair
-    for pair in pairs:
-        row = [pair]
-        for user_name in sorted_users:
-            row.append(pair_points[pair][user_name] if user_name in pair_points[pair] else None)
-        result.append(row)
+async def fetch_points(pg_con: PostgresConnection, competition_id: int, group_id: int,
+                       primary: bool = False) -> tp.Optional[tp.List[tp.List]]:
+    """
+    The simple leaderboard table, or None when nobody in the group has bets.
+    """
+    points = await pg_con.get_records(queries.POINTS, competition_id, group_id, primary=primary,
+                                      cache_tags=[competition_tag(competition_id), group_tag(group_id)])
+    if len(points) == 0:
+        return None
+    return [list(points[0].keys())] + points
 
-    # Add overall row
-    overall_row = ['overall']
-    for user_name in sorted_users:
-        overall_row.append(user_points[user_name])
-    result = result[:16]
-    result.append(overall_row)
 
-    return result
+async def fetch_points_page(pg_con: PostgresConnection, competition_id: int, group_id: int,
+                            page: int,
+                            primary: bool = False) -> tp.Optional[tp.Tuple[tp.List[tp.List], str, int]]:
+    """
+    A page of the detailed leaderboard with its title and the number of pages, or None when the page is empty.
+    """
+    rows = await pg_con.get_records(queries.POINTS_DETAILED_PAGE, competition_id, group_id, page * MAX_PAIRS,
+                                    MAX_PAIRS, primary=primary,
+                                    cache_tags=[competition_tag(competition_id), group_tag(group_id)])
+    if not rows[0]['pairs']:
+        return None
+    pairs_count = rows[0]['pairs_count']
+    first, last = page * MAX_PAIRS + 1, page * MAX_PAIRS + len(rows[0]['pairs'])
+    pages = (pairs_count + MAX_PAIRS - 1) // MAX_PAIRS
+    return points_page_table(rows[0]), f"Points table, matches {first}-{last} of {pairs_count}", pages
+
+
+async def fetch_stage_matches(pg_con: PostgresConnection, competition_id: int, stage: str,
+                              primary: bool = False) -> tp.Optional[tp.List[tp.List]]:
+    matches = await pg_con.get_records(queries.STAGE_MATCHES, competition_id, stage, primary=primary,
+                                       cache_tags=[competition_tag(competition_id)])
+    if len(matches) == 0:
+        return None
+    return [list(matches[0].keys())] + matches
+
+
+def points_detailed_levels(table_data: tp.List[tp.List]) -> tp.Dict[tp.Tuple[int, int], float]:
+    """
+    Points of every user and pair cell scaled to [0, 1] between the smallest and the largest value in the table.
+    Missing bets count as 0.
+    """
+    # Imported here: it's only needed where tables are drawn, and the bot process starts without it
+    import numpy as np
 
+    values = np.array([[0.0 if cell is None else float(cell) for cell in row[1:]] for row in table_data[1:-1]],
+                      dtype=float)
+    if values.size == 0:
+        return {}
+    span = values.max() - values.min()
+    scaled = (values - values.min()) / span if span > 0 else np.zeros_like(values)
+    return {(i, j): level for i, row in enumerate(scaled.tolist(), start=1) for j, level in enumerate(row, start=1)}
 
-def make_plot_points_detailed(table_data: tp.List[tp.List], name: str) -> types.BufferedInputFile:
-    def check_none(value: tp.Optional[float]) -> float:
-        if value is None:
-            return 0
-        else:
-            return float(value)
 
-    table_data = pivot_table(table_data)
+def make_plot_points_detailed(table_data: tp.List[tp.List], name: str) -> bytes:
+    colors = {cell: rd_yl_gn(level) for cell, level in points_detailed_levels(table_data).items()}
+    return get_renderer().draw_table(table_data, colors, name, POINTS_DETAILED_STYLE)
 
-    all_values = [check_none(cell) for row in table_data[1:-1] for cell in row[1:]]
-    vmin, vmax = min(all_values), max(all_values)
 
-    cmap = matplotlib.colormaps['RdYlGn']
-    norm = mcolors.Normalize(vmin=vmin, vmax=vmax)
+class VersionedCache:
+    """
+    Values built from the database, kept until their tag's version is bumped.
+
+    PostgresConnection calls bump for every invalidated tag, including the ones the parser sends with NOTIFY, so
+    entries live as long as the data behind them. A value built while its tag was bumped is stored under the old
+    version and never served. max_age is a fallback for when the NOTIFY subscription is down.
+    """
+    def __init__(self, max_age: float = 3600.0):
+        self.max_age = max_age
+        self._versions: tp.Dict[str, int] = defaultdict(int)
+        self._entries: tp.Dict[str, tp.Tuple[int, float, tp.Any]] = {}
 
-    fig, ax = plt.subplots(figsize=(30, 10), dpi=200)
-    ax.axis('off')
+    def version(self, tag: str) -> int:
+        return self._versions[tag]
 
-    table = ax.table(cellText=table_data, loc='center', cellLoc='center')
-    table.auto_set_font_size(False)
-    table.set_fontsize(11)
-    table.scale(1.2, 2)
+    def get(self, tag: str) -> tp.Optional[tp.Any]:
+        entry = self._entries.get(tag)
+        if entry is None or entry[0] != self._versions[tag] or time.monotonic() - entry[1] > self.max_age:
+            return None
+        return entry[2]
 
-    for i, row in enumerate(table_data[1:-1], start=1):
-        for j, cell in enumerate(row[1:], start=1):
-            color = cmap(norm(check_none(cell)))
-            table[(i, j)].set_facecolor(color)
+    def set(self, tag: str, version: int, value: tp.Any) -> None:
+        if version == self._versions[tag]:
+            self._entries[tag] = (version, time.monotonic(), value)
 
-    plt.title(name)
+    def bump(self, *tags: str) -> None:
+        for tag in tags:
+            self._versions[tag] += 1
+            self._entries.pop(tag, None)
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
 
-    plt.close(fig)
-    return types.BufferedInputFile(buf.read(), 'file.png')
+keyboard_cache = VersionedCache()
 
 
 async def generate_stage_keyboard(competition_id: int, pg_con: PostgresConnection) -> types.InlineKeyboardMarkup:
-    query = f"""
-    select
-            stage
-    from
-            bets.matches
-    where
-            competition_id = {competition_id}
-            and exists (select 1 from bets.groups_in_competitions as gic where gic.competition_id = 
-                bets.matches.competition_id and case when gic.starting_stage = 'play off' then bets.matches.stage 
-                like '%final%' else 1 = 1 end)
-    group by 
-            stage
-    order by 
-            min(dt)
-    """
-    stages = await pg_con.get_data(query)
+    tag = competition_tag(competition_id)
+    keyboard = keyboard_cache.get(tag)
+    if keyboard is not None:
+        return keyboard
+
+    # Built rarely, so read from the primary: a lagging replica could cache a keyboard the parser just invalidated
+    version = keyboard_cache.version(tag)
+    stages = await pg_con.get_records(queries.COMPETITION_STAGES, competition_id, primary=True)
     keyboard_buttons = []
     for stage in stages:
         stage = stage['stage']
         keyboard_buttons.append([types.InlineKeyboardButton(text=stage, callback_data=f'stage_{stage}')])
 
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+    keyboard_cache.set(tag, version, keyboard)
     return keyboard
 
 
@@ -219,25 +246,36 @@ def generate_stats_keyboard() -> types.InlineKeyboardMarkup:
 
 
 async def generate_competition_keyboard(pg_con: PostgresConnection) -> types.InlineKeyboardMarkup:
-    query = f"""
-    select
-            id, name 
-    from
-            bets.competitions
-    where
-            start_date - now() > interval '1 day'
-    """
+    # Competitions that haven't started yet are cached and the one-day cut-off is applied here, so the cached rows
+    # stay valid as time passes.
+    competitions = keyboard_cache.get(COMPETITIONS_TAG)
+    if competitions is None:
+        version = keyboard_cache.version(COMPETITIONS_TAG)
+        competitions = await pg_con.get_records(queries.UPCOMING_COMPETITIONS, primary=True)
+        keyboard_cache.set(COMPETITIONS_TAG, version, competitions)
 
-    competitions = await pg_con.get_data(query)
     keyboard_buttons = []
     for competition in competitions:
-        c_id, name = competition['id'], competition['name']
+        c_id, name, start_date = competition['id'], competition['name'], competition['start_date']
+        if start_date - datetime.now(start_date.tzinfo) <= timedelta(days=1):
+            continue
         keyboard_buttons.append([types.InlineKeyboardButton(text=name, callback_data=f'stage_{c_id}_{name}')])
 
     keyboard = types.InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
     return keyboard
 
 
+def generate_page_keyboard(page: int, pages: int) -> tp.Optional[types.InlineKeyboardMarkup]:
+    buttons = []
+    if page > 0:
+        buttons.append(types.InlineKeyboardButton(text='< Previous', callback_data=f'page_{page - 1}'))
+    if page < pages - 1:
+        buttons.append(types.InlineKeyboardButton(text='Next >', callback_data=f'page_{page + 1}'))
+    if not buttons:
+        return None
+    return types.InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
 def generate_number_keyboard() -> types.InlineKeyboardMarkup:
     keyboard_buttons = []
     for i in range(11):
@@ -0,0 +1,72 @@
+"""
+Renders per second and peak RSS of the matplotlib renderer with and without figure templates.
+
+Every mode runs in a fresh process, so peak RSS isn't shared between them. The workload cycles through tables of a
+few realistic shapes with new data every time, like renders for different groups.
+
+Run from the repository root: python -m benchmarks.figure_templates [--renders 60] [--templates 8]
+"""
+import argparse
+import multiprocessing
+import random
+import resource
+import time
+import typing as tp
+
+USERS = (5, 10, 20)
+
+
+def workload(renders: int) -> tp.Iterator[tp.Tuple[tp.Callable, tp.List[tp.List]]]:
+    from app.utils import make_plot_two_teams, make_plot_points, make_plot_points_detailed, points_page_table
+
+    rnd = random.Random(0)
+    for n in range(renders):
+        users = USERS[n % len(USERS)]
+        names = [f'user_{rnd.randint(0, 999)}' for _ in range(users)]
+        kind = n % 3
+        if kind == 0:
+            header = ['user', 'first_team_goals', 'second_team_goals', 'points', 'penalty_winner']
+            yield make_plot_two_teams, [header] + [
+                [name, rnd.randint(0, 4), rnd.randint(0, 4), rnd.choice([0, 1, 3, 5]), rnd.choice([None, 1, 2])]
+                for name in names]
+        elif kind == 1:
+            yield make_plot_points, [['user', 'points', 'delta']] + [
+                [name, rnd.randint(0, 60), rnd.randint(-5, 5)] for name in names]
+        else:
+            pairs = [f'Team {p} - Team {p + 1}' for p in range(15)]
+            points = [[rnd.choice([None, 0, 1, 3, 5]) for _ in names] for _ in pairs]
+            totals = [sum(row[k] or 0 for row in points) for k in range(users)]
+            yield make_plot_points_detailed, points_page_table({'user_names': names, 'totals': totals, 'pairs': pairs,
+                                                                'points': points})
+
+
+def run(templates: int, renders: int) -> tp.Tuple[float, int]:
+    import app.utils.renderers as renderers
+
+    renderers._renderer = renderers.MatplotlibRenderer(max_templates=templates)
+    jobs = list(workload(renders))
+    for fn, table in jobs[:len(USERS) * 3]:
+        fn(table, 'Warm-up')
+    start = time.perf_counter()
+    for fn, table in jobs:
+        fn(table, 'Benchmark')
+    rate = len(jobs) / (time.perf_counter() - start)
+    return rate, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=60)
+    parser.add_argument('--templates', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f'{"mode":<22}{"renders/s":>10}{"peak RSS MB":>13}')
+    context = multiprocessing.get_context('spawn')
+    for mode, templates in (('new figure per render', 0), (f'{args.templates} templates', args.templates)):
+        with context.Pool(1) as pool:
+            rate, rss = pool.apply(run, (templates, args.renders))
+        print(f'{mode:<22}{rate:>10.2f}{rss:>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Colour levels of the detailed points table with points_detailed_levels against the plain Python loop it replaced,
+checking both agree.
+
+Run from the repository root: python -m benchmarks.points_detailed [--users 50] [--pairs 64] [--repeat 20]
+"""
+import argparse
+import random
+import time
+import typing as tp
+
+from app.utils import points_detailed_levels, points_page_table
+
+
+def make_table(users: int, pairs: int, seed: int = 0) -> tp.List[tp.List]:
+    """
+    A full tournament as drawn from POINTS_DETAILED_PAGE rows: a few bets are missing and points repeat a lot.
+    """
+    rnd = random.Random(seed)
+    pair_names = [f'Team {p:02d} - Team {p + 1:02d}' for p in range(pairs)]
+    points = [[rnd.choice([0, 0, 1, 3, 5]) if rnd.random() < 0.9 else None for _ in range(users)] for _ in pair_names]
+    totals = [sum(row[u] or 0 for row in points) for u in range(users)]
+    return points_page_table({'user_names': [f'user_{u}' for u in range(users)], 'totals': totals,
+                              'pairs': pair_names, 'points': points})
+
+
+def python_levels(table_data: tp.List[tp.List]) -> tp.Dict[tp.Tuple[int, int], float]:
+    values = [[0.0 if cell is None else float(cell) for cell in row[1:]] for row in table_data[1:-1]]
+    vmin, vmax = min(min(row) for row in values), max(max(row) for row in values)
+    return {(i, j): (value - vmin) / (vmax - vmin) if vmax > vmin else 0.0
+            for i, row in enumerate(values, start=1) for j, value in enumerate(row, start=1)}
+
+
+def timed(fn: tp.Callable[[], tp.Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--pairs', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"users":>6}{"pairs":>7}{"python ms":>11}{"numpy ms":>10}')
+    for users in (args.users, args.users * 4):
+        for pairs in (15, args.pairs):
+            table = make_table(users, pairs)
+            assert points_detailed_levels(table) == python_levels(table)
+            print(f'{users:>6}{pairs:>7}{timed(lambda: python_levels(table), args.repeat):>11.2f}'
+                  f'{timed(lambda: points_detailed_levels(table), args.repeat):>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Renders per second of each table renderer on realistic group sizes.
+
+Run from the repository root: python -m benchmarks.render_backends [--users 20] [--pairs 15] [--seconds 5]
+"""
+import argparse
+import random
+import time
+import typing as tp
+
+from app.utils import (RENDERERS, make_plot_two_teams, make_plot_points, make_plot_points_detailed, points_page_table,
+                       MAX_PAIRS)
+import app.utils.renderers as renderers
+
+
+def detailed_table(rnd: random.Random, names: tp.List[str], pairs: int) -> tp.List[tp.List]:
+    # Shaped like a POINTS_DETAILED_PAGE row, which the database has already pivoted
+    pair_names = [f'Team {p} - Team {p + 1}' for p in range(min(pairs, MAX_PAIRS))]
+    points = [[rnd.choice([None, 0, 1, 3, 5]) for _ in names] for _ in pair_names]
+    totals = [sum(row[k] or 0 for row in points) for k in range(len(names))]
+    return points_page_table({'user_names': names, 'totals': totals, 'pairs': pair_names, 'points': points})
+
+
+def make_tables(users: int, pairs: int) -> tp.Dict[str, tp.Tuple[tp.Callable, tp.List[tp.List]]]:
+    rnd = random.Random(0)
+    names = [f'user_{i}' for i in range(users)]
+    match_bets = [['user', 'first_team_goals', 'second_team_goals', 'points', 'penalty_winner']] + [
+        [name, rnd.randint(0, 4), rnd.randint(0, 4), rnd.choice([0, 1, 3, 5]), rnd.choice([None, 1, 2])]
+        for name in names]
+    points = [['user', 'points', 'delta']] + [[name, rnd.randint(0, 60), rnd.randint(-5, 5)] for name in names]
+    return {
+        'two_teams': (make_plot_two_teams, match_bets),
+        'points': (make_plot_points, points),
+        'points_detailed': (make_plot_points_detailed, detailed_table(rnd, names, pairs)),
+    }
+
+
+def bench(fn: tp.Callable, table: tp.List[tp.List], seconds: float) -> tp.Tuple[float, int]:
+    fn(table, 'Benchmark')
+    count, size = 0, 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        size = len(fn(table, 'Benchmark'))
+        count += 1
+    return count / (time.perf_counter() - start), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--pairs', type=int, default=15)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    tables = make_tables(args.users, args.pairs)
+    print(f'{"backend":<12}{"table":<18}{"renders/s":>10}{"PNG KB":>10}')
+    for backend, renderer in RENDERERS.items():
+        renderers._renderer = renderer()
+        for kind, (fn, table) in tables.items():
+            rate, size = bench(fn, table, args.seconds)
+            print(f'{backend:<12}{kind:<18}{rate:>10.1f}{size / 1024:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
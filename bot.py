@@ -1,11 +1,15 @@
 import asyncio
 import logging
 import os
+import typing as tp
 
+from app.startup import startup_report
 from aiogram import Bot, Dispatcher, Router
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import BotCommand
-from app.dbworker import PostgresConnection
+from app.dbworker import PostgresConnection, QueryCache, QueryProfiler
+from app.models import MembershipIndex
+from app.utils import keyboard_cache, render_backend, render_cache, render_pool, file_ids, output_modes, Prerenderer
 from app.handlers import (register_handlers_add_bet, register_handlers_check_bet,
                           register_handlers_check_competition, register_handlers_check_leaders,
                           register_handlers_common, register_handlers_manage_groups)
@@ -14,6 +18,7 @@ logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s+3h - %(levelname)s - %(name)s - %(message)s",
 )
+startup_report.mark('imports')
 
 
 async def set_commands(bot: Bot):
@@ -24,31 +29,105 @@ async def set_commands(bot: Bot):
         BotCommand(command='/check_competition', description='Check competition results'),
         BotCommand(command='/check_leaders', description='Check points of users'),
         BotCommand(command='/manage_groups', description='Manage groups'),
+        BotCommand(command='/output', description='Switch results between images and text'),
         BotCommand(command='/help', description='Help')
     ]
     await bot.set_my_commands(commands)
 
 
+async def warm_up(bot: Bot):
+    """
+    Runs after polling starts: the first updates are served right away while the commands are set and the render
+    workers spawn and load the renderer.
+    """
+    try:
+        await set_commands(bot)
+        await render_pool.warm_up()
+        startup_report.mark('warm-up')
+    except Exception as e:
+        logging.error(f'Warm-up failed: {e}')
+
+
 async def main():
     bot = Bot(token=os.environ.get('BOT_TOKEN'))
+    # Files the bot writes default to one directory next to bot.py, whatever the working directory is
+    data_dir = os.environ.get('BOT_data_dir', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+    os.makedirs(data_dir, exist_ok=True)
     pg_connection = PostgresConnection(user=os.environ.get('PG_user'), password=os.environ.get('PG_password'),
-                                       dbname=os.environ.get('PG_db'), host=os.environ.get('PG_host'))
+                                       dbname=os.environ.get('PG_db'), host=os.environ.get('PG_host'),
+                                       min_size=int(os.environ.get('PG_pool_min_size', 2)),
+                                       max_size=int(os.environ.get('PG_pool_max_size', 10)),
+                                       statement_cache_size=int(os.environ.get('PG_statement_cache_size', 0)),
+                                       max_inactive_connection_lifetime=float(
+                                           os.environ.get('PG_pool_idle_timeout', 300)),
+                                       replica_dsns=[dsn for dsn in os.environ.get('PG_replica_dsns', '').split(',')
+                                                     if dsn],
+                                       max_replica_lag=float(os.environ.get('PG_max_replica_lag', 5)),
+                                       listen_dsn=os.environ.get('PG_listen_dsn') or None,
+                                       cache=QueryCache(max_entries=int(os.environ.get('PG_cache_size', 1024)),
+                                                        default_ttl=float(os.environ.get('PG_cache_ttl', 300))),
+                                       profiler=QueryProfiler(
+                                           threshold=float(os.environ.get('PG_slow_query_threshold', 0.5)),
+                                           explain_sample_rate=float(os.environ.get('PG_explain_sample_rate', 0.1)),
+                                           log_path=os.environ.get('PG_slow_query_log',
+                                                                   os.path.join(data_dir, 'slow_queries.log'))))
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
+    startup_report.configure(log_path=os.environ.get('STARTUP_report_path',
+                                                      os.path.join(data_dir, 'startup_report.log')),
+                             release=os.environ.get('BOT_release'))
+    dp.update.outer_middleware(startup_report.first_update_middleware)
+    background: tp.Set[asyncio.Task] = set()
+
+    async def on_startup(bot: Bot):
+        startup_report.mark('polling started')
+        task = asyncio.create_task(warm_up(bot))
+        background.add(task)
+        task.add_done_callback(background.discard)
+
+    dp.startup.register(on_startup)
+
+    pg_connection.add_invalidation_hook(keyboard_cache.bump)
+    logging.info(f'Rendering tables with the {render_backend()} backend')
+    prerenderer = Prerenderer(pg_connection, delay=float(os.environ.get('RENDER_prerender_delay', 5)),
+                              concurrency=int(os.environ.get('RENDER_prerender_concurrency', 2)))
+    pg_connection.add_invalidation_hook(prerenderer.on_invalidate, notified_only=True)
+    render_pool.configure(workers=int(os.environ.get('RENDER_workers', 2)),
+                          max_tasks=int(os.environ.get('RENDER_max_tasks', 200)),
+                          max_worker_rss_mb=int(os.environ.get('RENDER_max_worker_rss_mb', 512)),
+                          max_queue=int(os.environ.get('RENDER_max_queue', 16)))
+    render_cache.configure(max_bytes=int(os.environ.get('RENDER_cache_mb', 64)) * 1024 * 1024,
+                           disk_dir=os.environ.get('RENDER_cache_dir') or None,
+                           max_disk_bytes=int(os.environ.get('RENDER_cache_disk_mb', 512)) * 1024 * 1024)
+    output_modes.configure(os.environ.get('OUTPUT_modes_path', os.path.join(data_dir, 'output_modes.json')))
 
     router = Router()
-    register_handlers_add_bet(router, pg_connection)
-    register_handlers_check_competition(router, pg_connection)
-    register_handlers_check_leaders(router, pg_connection)
-    register_handlers_check_bet(router, pg_connection)
-    register_handlers_manage_groups(router, pg_connection)
-    register_handlers_common(router, pg_connection)
+    membership = MembershipIndex()
+    register_handlers_add_bet(router, pg_connection, membership)
+    register_handlers_check_competition(router, pg_connection, membership)
+    register_handlers_check_leaders(router, pg_connection, membership)
+    register_handlers_check_bet(router, pg_connection, membership)
+    register_handlers_manage_groups(router, pg_connection, membership)
+    register_handlers_common(router, pg_connection, membership)
 
     dp.include_routers(router)
 
-    await set_commands(bot)
+    await pg_connection.create_pool()
+    startup_report.mark('database pool')
+    try:
+        await membership.load(pg_connection)
+        startup_report.mark('membership index')
 
-    await dp.start_polling(bot)
+        await dp.start_polling(bot)
+    finally:
+        for task in list(background):
+            task.cancel()
+        prerenderer.shutdown()
+        logging.info(f'Render pool stats: {render_pool.stats()}')
+        logging.info(f'Render cache stats: {render_cache.stats()}')
+        logging.info(f'Telegram file_id stats: {file_ids.stats()}')
+        render_pool.shutdown()
+        await pg_connection.close_pool()
 
 
 if __name__ == '__main__':
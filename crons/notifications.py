@@ -1,3 +1,4 @@
+import itertools
 import os
 import psycopg2
 import requests
@@ -11,15 +12,9 @@ for handler in logger.handlers:
     handler.setFormatter(formatter)
 
 
-def make_dict(records: tp.List) -> tp.Dict:
-    users_matches = dict()
-    for record in records:
-        first_name, user_id, pair, group_name, competition_name, dt = record
-        if user_id not in users_matches:
-            users_matches[str(user_id)] = [[first_name, pair, group_name, competition_name, dt]]
-        else:
-            users_matches[str(user_id)].append([first_name, pair, group_name, competition_name, dt])
-    return users_matches
+def make_attributes(records: tp.Iterable) -> tp.List:
+    return [[first_name, pair, group_name, competition_name, dt]
+            for first_name, _, pair, group_name, competition_name, dt in records]
 
 
 def make_message(attributes: tp.List) -> str:
@@ -47,24 +42,27 @@ def send_to_channel(message: str, chat_id: str, user_name: str) -> None:
         logger.error(f'Failed to send message for {user_name}: {response.status_code} - {response.text}')
 
 
-def get_data_from_db(query: str) -> tp.List:
+def iterate_data_from_db(query: str, chunk_size: int = 1000) -> tp.Iterator[tp.Tuple]:
+    """
+    Streams query results from a server-side cursor, chunk_size rows per round-trip.
+    """
     try:
-
         connection = psycopg2.connect(f"postgresql://{os.environ.get('PG_user')}:{os.environ.get('PG_password')}@"
                                       f"{os.environ.get('PG_host')}:6432/{os.environ.get('PG_db')}")
+    except Exception as e:
+        logger.error(f"Error connecting to database: {e}")
+        return
 
-        cursor = connection.cursor()
-        cursor.execute(query)
-        records = cursor.fetchall()
-
-        cursor.close()
-        connection.close()
-
-        return records
-
+    try:
+        with connection:
+            with connection.cursor(name='notifications') as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(query)
+                yield from cursor
     except Exception as e:
         logger.error(f"Error fetching data from database: {e}")
-        return []
+    finally:
+        connection.close()
 
 
 def main():
@@ -97,15 +95,12 @@ def main():
             not exists (select 1 from bets.bets as bts where bts.user_id = usr.id and bts.competition_id = cmpt.id and 
             bts.group_id = grps.id and bts.match_id = mtch.id)
             and dt - now() between interval '1 hours' and interval '3 hours'
-        order by usr.first_name, mtch.dt
+        order by usr.id, mtch.dt
     """
-    records = get_data_from_db(query)
-
-    users_matches = make_dict(records)
-
-    for user in users_matches:
-        message = make_message(users_matches[user])
-        send_to_channel(message, user, users_matches[user][0][0])
+    for user_id, records in itertools.groupby(iterate_data_from_db(query), key=lambda record: record[1]):
+        attributes = make_attributes(records)
+        message = make_message(attributes)
+        send_to_channel(message, str(user_id), attributes[0][0])
 
 
 if __name__ == '__main__':
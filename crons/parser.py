@@ -13,6 +13,9 @@ formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(messag
 for handler in logger.handlers:
     handler.setFormatter(formatter)
 
+# The bot listens on this channel and drops cached query results carrying the notified tags
+CACHE_CHANNEL = 'bet_bot_cache'
+
 
 def create_dt(dt: str) -> str:
     original_date = datetime.fromisoformat(dt.replace("Z", "+00:00"))
@@ -160,6 +163,12 @@ class DatabaseHandler:
             self.connection = None
             logger.info("Database connection closed")
 
+    @staticmethod
+    def notify_cache(cursor, tags: tp.Iterable[str]):
+        payload = ','.join(sorted(set(tags)))
+        if payload:
+            cursor.execute("SELECT pg_notify(%s, %s)", (CACHE_CHANNEL, payload))
+
     def check_existing_competition(self, competitions: tp.List[Competition]):
         ids_list = ', '.join([str(competition.id) for competition in competitions])
         try:
@@ -198,6 +207,7 @@ class DatabaseHandler:
                 self.connect()
                 cursor = self.connection.cursor()
                 psycopg2.extras.execute_values(cursor, insert_query, insert_data)
+                self.notify_cache(cursor, ['competitions'])
                 self.connection.commit()
             except Exception as e:
                 logger.error(f"Error inserting or updating matches: {e}")
@@ -276,6 +286,8 @@ class DatabaseHandler:
                 """
                 cursor.executemany(update_query, update_data)
 
+            if insert_data or update_data:
+                self.notify_cache(cursor, [f'competition:{match.competition_id}' for match in matches])
             self.connection.commit()
             cursor.close()
             logger.info("Database operations completed successfully")
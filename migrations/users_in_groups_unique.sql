@@ -0,0 +1,11 @@
+-- JOIN_GROUP relies on ON CONFLICT (user_id, group_id), which needs a unique index on the pair.
+-- Safe to run more than once. Duplicate memberships left by concurrent joins are removed first.
+
+delete from bets.users_in_groups as dup
+using bets.users_in_groups as kept
+where dup.user_id = kept.user_id
+  and dup.group_id = kept.group_id
+  and dup.ctid > kept.ctid;
+
+create unique index if not exists users_in_groups_user_id_group_id_key
+    on bets.users_in_groups (user_id, group_id);
@@ -0,0 +1,83 @@
+import pytest
+
+from app.dbworker import cache as cache_module
+from app.dbworker.cache import QueryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache(default_ttl=10)
+    cache.set('default', 1)
+    cache.set('short', 2, ttl=1)
+    clock.now += 5
+    assert cache.get('default') == (True, 1)
+    assert cache.get('short') == (False, None)
+    clock.now += 6
+    assert cache.get('default') == (False, None)
+    assert cache.stats() == {'entries': 0, 'hits': 1, 'misses': 2}
+
+
+def test_evicts_least_recently_used():
+    cache = QueryCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+
+
+def test_invalidate_drops_tagged_entries():
+    cache = QueryCache()
+    cache.set('competition', 1, tags=['competition:1'])
+    cache.set('both', 2, tags=['competition:1', 'group:1'])
+    cache.set('group', 3, tags=['group:1'])
+    assert cache.invalidate('competition:1') == 2
+    assert cache.get('competition') == (False, None)
+    assert cache.get('both') == (False, None)
+    assert cache.get('group') == (True, 3)
+    assert cache.invalidate('competition:1') == 0
+    assert cache.invalidate('group:1') == 1
+
+
+def test_overwrite_moves_tags():
+    cache = QueryCache()
+    cache.set('key', 1, tags=['group:1'])
+    cache.set('key', 2, tags=['group:2'])
+    assert cache.invalidate('group:1') == 0
+    assert cache.get('key') == (True, 2)
+
+
+def test_write_racing_invalidation_is_not_stored():
+    cache = QueryCache()
+    generation = cache.generation
+    # The query result was read before this invalidation, so it may be stale
+    cache.invalidate('competition:1')
+    cache.set('key', 1, tags=['competition:2'], generation=generation)
+    assert cache.get('key') == (False, None)
+    cache.set('key', 1, tags=['competition:2'], generation=cache.generation)
+    assert cache.get('key') == (True, 1)
+
+
+def test_clear_discards_racing_writes():
+    cache = QueryCache()
+    cache.set('a', 1)
+    generation = cache.generation
+    cache.clear()
+    cache.set('b', 2, generation=generation)
+    assert cache.stats()['entries'] == 0
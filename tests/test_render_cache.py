@@ -0,0 +1,48 @@
+import asyncio
+import os
+import time
+
+from app.utils.render_cache import RenderCache
+
+
+def test_evicts_least_recently_used_over_budget():
+    async def run():
+        cache = RenderCache(max_bytes=250)
+        await cache.set('a', bytes(100))
+        await cache.set('b', bytes(100))
+        await cache.get('a')
+        await cache.set('c', bytes(100))
+        await cache.set('huge', bytes(300))
+        return [await cache.get(key) is not None for key in ('a', 'b', 'c', 'huge')], cache.stats()
+
+    present, stats = asyncio.run(run())
+    assert present == [True, False, True, False]
+    assert stats['bytes'] == 200
+
+
+def test_disk_tier_survives_restart_and_is_trimmed(tmp_path):
+    async def run():
+        cache = RenderCache(disk_dir=str(tmp_path), max_disk_bytes=250)
+        for key in ('a', 'b', 'c'):
+            await cache.set(key, bytes(100))
+            # Files are ordered by mtime on the next start
+            time.sleep(0.01)
+        restarted = RenderCache(disk_dir=str(tmp_path), max_disk_bytes=250)
+        return [await restarted.get(key) for key in ('a', 'b', 'c')], restarted.stats()
+
+    images, stats = asyncio.run(run())
+    assert images == [None, bytes(100), bytes(100)]
+    assert sorted(os.listdir(tmp_path)) == ['b.png', 'c.png']
+    assert stats['disk_hits'] == 2 and stats['disk_bytes'] == 200
+
+
+def test_smaller_disk_budget_trims_on_configure(tmp_path):
+    async def run():
+        cache = RenderCache(disk_dir=str(tmp_path))
+        for key in ('a', 'b'):
+            await cache.set(key, bytes(100))
+            time.sleep(0.01)
+        cache.configure(max_bytes=cache.max_bytes, disk_dir=str(tmp_path), max_disk_bytes=100)
+
+    asyncio.run(run())
+    assert os.listdir(tmp_path) == ['b.png']
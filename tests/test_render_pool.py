@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.utils.render_pool import RenderPool
+
+
+def echo(value: int) -> int:
+    return value
+
+
+@pytest.fixture(autouse=True)
+def native_backend(monkeypatch):
+    # Spawned workers inherit the environment, the native renderer keeps their start-up short
+    monkeypatch.setenv('RENDER_BACKEND', 'native')
+
+
+def test_recycles_past_max_tasks():
+    async def run():
+        pool = RenderPool(workers=1, max_tasks=2, max_queue=4)
+        try:
+            results = [await pool.submit(echo, i) for i in range(5)]
+        finally:
+            pool.shutdown()
+        return results, pool
+
+    results, pool = asyncio.run(run())
+    assert results == [0, 1, 2, 3, 4]
+    assert pool.rendered == 5
+    assert pool.recycled == 2
+
+
+def test_concurrent_renders_across_recycle():
+    async def run():
+        pool = RenderPool(workers=2, max_tasks=1, max_queue=3)
+        try:
+            return await asyncio.gather(*(pool.submit(echo, i) for i in range(7))), pool
+        finally:
+            pool.shutdown()
+
+    results, pool = asyncio.run(run())
+    assert results == list(range(7))
+    assert pool.recycled >= 3
+    assert pool.stats()['in_flight'] == 0
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.dbworker.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            call = calls
+            await asyncio.sleep(0.01)
+            return call
+
+        results = await asyncio.gather(*(flight.do('key', fetch) for _ in range(5)), flight.do('other', fetch))
+        return results, flight
+
+    results, flight = asyncio.run(run())
+    assert results == [1, 1, 1, 1, 1, 2]
+    assert flight.stats() == {'executions': 2, 'saved': 4, 'in_flight': 0}
+
+
+def test_followers_get_the_leaders_exception():
+    async def run():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError('boom')
+
+        return await asyncio.gather(*(flight.do('key', fail) for _ in range(3)), return_exceptions=True), flight
+
+    results, flight = asyncio.run(run())
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert flight.executions == 1
+
+
+def test_followers_retry_when_leader_is_cancelled():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            started.set()
+            await asyncio.sleep(0.05)
+            return calls
+
+        leader = asyncio.create_task(flight.do('key', fetch))
+        await started.wait()
+        followers = [asyncio.create_task(flight.do('key', fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers), flight
+
+    results, flight = asyncio.run(run())
+    # One follower becomes the new leader, the other two wait for it
+    assert results == [2, 2, 2]
+    assert flight.stats() == {'executions': 2, 'saved': 2, 'in_flight': 0}
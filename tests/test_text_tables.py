@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from app.utils.text_tables import MAX_MESSAGE_LENGTH, OutputModes, format_table, _message_length
+
+
+def test_format_table_aligns_columns():
+    text = format_table([['name', 'points'], ['alice', 3], ['bob', None]], {(1, 1): '🟩'}, 'Leaders')
+    assert text == '<b>Leaders</b>\n<pre>name  points\nalice 🟩3\nbob   -</pre>'
+
+
+def test_message_length_counts_utf16_units():
+    assert _message_length('ab') == 2
+    assert _message_length('🟩') == 2
+
+
+def test_format_table_drops_rows_keeping_the_last():
+    table = [['name', 'points']] + [[f'user {i}', i] for i in range(400)] + [['total', 'sum']]
+    text = format_table(table, {}, 'Leaders', keep_last_row=True)
+    assert _message_length(text) <= MAX_MESSAGE_LENGTH
+    assert 'user 0 ' in text and 'user 399' not in text
+    assert text[:-len('</pre>')].split('\n')[-1].split() == ['total', 'sum']
+
+
+def test_format_table_drops_columns_first():
+    table = [['name'] + [f'match {j}' for j in range(400)], ['alice'] + list(range(400))]
+    text = format_table(table, {}, 'Points', columns_first=True)
+    assert _message_length(text) <= MAX_MESSAGE_LENGTH
+    assert 'match 0 ' in text and 'match 399' not in text
+
+
+def test_format_table_gives_up_when_a_cell_does_not_fit():
+    assert format_table([['name', 'points'], ['🟩' * MAX_MESSAGE_LENGTH, 1]], {}, 'Leaders') is None
+
+
+def test_output_modes_persist(tmp_path):
+    path = str(tmp_path / 'output_modes.json')
+
+    async def run():
+        modes = OutputModes(path)
+        return await modes.toggle(1), await modes.toggle(2), await modes.toggle(1)
+
+    assert asyncio.run(run()) == (True, True, False)
+    with open(path) as f:
+        assert json.load(f) == [2]
+    reloaded = OutputModes(path)
+    assert reloaded.prefers_text(2) and not reloaded.prefers_text(1)
@@ -0,0 +1,48 @@
+from app.utils.utilities import BoundedSet, VersionedCache, points_detailed_levels, points_page_table
+
+
+def detailed_table(points):
+    pairs = [f'pair {i}' for i in range(len(points))]
+    return points_page_table({'user_names': ['a', 'b'], 'totals': [0, 0], 'pairs': pairs, 'points': points})
+
+
+def test_points_detailed_levels_scales_between_min_and_max():
+    levels = points_detailed_levels(detailed_table([[0, 4], [2, None]]))
+    assert levels == {(1, 1): 0.0, (1, 2): 1.0, (2, 1): 0.5, (2, 2): 0.0}
+
+
+def test_points_detailed_levels_equal_values():
+    assert set(points_detailed_levels(detailed_table([[3, 3]])).values()) == {0.0}
+
+
+def test_points_detailed_levels_without_pairs():
+    assert points_detailed_levels(detailed_table([])) == {}
+
+
+def test_bounded_set_keeps_most_recently_used():
+    items = BoundedSet(2)
+    items.add(1)
+    items.add(2)
+    assert 1 in items
+    items.add(3)
+    assert 2 not in items
+    assert 1 in items and 3 in items
+    items.discard(1)
+    assert len(items) == 1
+
+
+def test_versioned_cache_drops_bumped_values():
+    cache = VersionedCache()
+    version = cache.version('competition:1')
+    cache.set('competition:1', version, 'keyboard')
+    assert cache.get('competition:1') == 'keyboard'
+    cache.bump('competition:1')
+    assert cache.get('competition:1') is None
+
+
+def test_versioned_cache_ignores_values_built_during_a_bump():
+    cache = VersionedCache()
+    version = cache.version('competition:1')
+    cache.bump('competition:1')
+    cache.set('competition:1', version, 'stale keyboard')
+    assert cache.get('competition:1') is None